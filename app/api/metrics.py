@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from app.core.admission import requests_shed
+from app.core.metrics import REQUEST_METRICS, order_intake_lag, render_gauges
+from app.db.session import engine, pool_status, read_router
+from app.services.product import product_cache
+
+router = APIRouter()
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _pool_metrics() -> list:
+    engines = {"primary": engine}
+    if read_router is not None:
+        engines.update({f"replica_{i}": replica for i, replica in enumerate(read_router.engines)})
+    by_metric = {}
+    for name, db_engine in engines.items():
+        for key, value in pool_status(db_engine).items():
+            by_metric.setdefault(key, {})[name] = value
+    lines = []
+    for key, values in by_metric.items():
+        lines += render_gauges(f"db_pool_{key}", f"Connection pool {key}.", values, label="engine")
+    return lines
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    lines = []
+    for metric in REQUEST_METRICS:
+        lines += metric.render()
+    lines += _pool_metrics()
+    lines += render_gauges("product_cache", "Product cache statistics", product_cache.stats())
+    dispatcher = getattr(request.app.state, "outbox_dispatcher", None)
+    if dispatcher is not None:
+        lines += render_gauges(
+            "outbox", "Outbox dispatcher counters",
+            {"dispatched_total": dispatcher.dispatched, "failures_total": dispatcher.failures}, type="counter",
+        )
+    lines += order_intake_lag.render()
+    admission = getattr(request.app.state, "admission", None)
+    if admission is not None:
+        lines += requests_shed.render()
+        for key, values in admission.stats().items():
+            lines += render_gauges(
+                f"admission_{key}", f"Admission control {key} per route class.", values, label="route_class"
+            )
+    workers = getattr(request.app.state, "order_intake_workers", None)
+    if workers is not None:
+        lines += render_gauges(
+            "order_intake", "Order intake queue",
+            {"queue_depth": workers.queue_depth, "oldest_queued_seconds": workers.oldest_queued_seconds},
+        )
+        lines += render_gauges(
+            "order_intake", "Order intake worker counters",
+            {"completed_total": workers.completed, "failed_total": workers.failed, "errors_total": workers.errors},
+            type="counter",
+        )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_MEDIA_TYPE)
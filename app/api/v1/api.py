@@ -1,7 +1,8 @@
 
 from fastapi import APIRouter
-from app.api.v1.endpoints import products, orders
+from app.api.v1.endpoints import products, orders, events
 
 api_router = APIRouter()
 api_router.include_router(products.router, prefix="/products", tags=["products"])
 api_router.include_router(orders.router, prefix="/orders", tags=["orders"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas.event import EventRead
+from app.services import outbox as outbox_service
+from app.db.session import get_db
+from app.core.config import settings
+
+router = APIRouter()
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+@router.get("/", response_model=List[EventRead])
+async def read_events(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0),
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[int] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """Return change events with ``id > after``, oldest first.
+
+    With ``wait`` the request is held open until an event arrives or ``wait``
+    seconds pass (capped at ``EVENTS_MAX_WAIT``). Clients that accept
+    ``text/event-stream`` get an open SSE stream instead and may resume from the
+    ``Last-Event-ID`` header.
+    """
+    if accept is not None and SSE_MEDIA_TYPE in accept:
+        if last_event_id is not None:
+            after = max(after, last_event_id)
+        return StreamingResponse(
+            outbox_service.event_stream(db, after=after, limit=limit, keepalive=settings.EVENTS_MAX_WAIT),
+            media_type=SSE_MEDIA_TYPE,
+            headers={"Cache-Control": "no-cache"},
+        )
+    return await outbox_service.wait_for_events(db, after=after, limit=limit, timeout=min(wait, settings.EVENTS_MAX_WAIT))
@@ -1,35 +1,149 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.order import OrderCreate, OrderRead, OrderUpdateStatus
+from app.schemas.export import ExportFormat
+from app.schemas.order import (
+    OrderCreate,
+    OrderFilter,
+    OrderIntakeRead,
+    OrderRead,
+    OrderSort,
+    OrderStats,
+    OrderStatus,
+    OrderStatusTransition,
+    OrderStatusTransitionResult,
+    OrderUpdateStatus,
+    order_list_adapter,
+)
+from app.services import export as export_service
 from app.services import order as order_service
-from app.db.session import get_db
-from app.core.exceptions import InsufficientStockError, ProductNotFoundError
+from app.services import order_intake as order_intake_service
+from app.db.session import get_db, get_read_db
+from app.core.config import settings
+from app.core.etag import cache_headers, etag_matches, list_etag, not_modified, version_etag
+from app.core.exceptions import (
+    IdempotencyKeyMismatchError,
+    InsufficientStockError,
+    InvalidCursorError,
+    InvalidStatusTransitionError,
+    ProductNotFoundError,
+    StockReservationConflictError,
+)
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.responses import RawJSONResponse
 
 router = APIRouter()
 
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
+
 
 @router.post("/", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
-async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
+async def create_order(
+    order: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        db_order = await order_service.create_order(db, order=order)
-        return db_order
+        db_order, replayed = await order_service.create_order(db, order=order, idempotency_key=idempotency_key)
     except (InsufficientStockError, ProductNotFoundError) as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except StockReservationConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+    return db_order
+
+
+@router.post("/intake", response_model=OrderIntakeRead, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_order(order: OrderCreate, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    intake = await order_intake_service.enqueue_order(db, order=order)
+    response.headers["Location"] = str(request.url_for("read_order_intake", intake_id=intake.id))
+    return intake
+
+
+@router.get("/intake/{intake_id}", response_model=OrderIntakeRead)
+async def read_order_intake(intake_id: int, db: AsyncSession = Depends(get_db)):
+    intake = await order_intake_service.get_order_intake(db, intake_id=intake_id)
+    if not intake:
+        raise HTTPException(status_code=404, detail="Queued order not found.")
+    return intake
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at is stored as naive UTC; an offset must be applied, not compared as text or rejected by the driver
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def order_filter(
+    status: Optional[List[OrderStatus]] = Query(None),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+) -> OrderFilter:
+    return OrderFilter(
+        status=status, created_from=_naive_utc(created_from), created_to=_naive_utc(created_to), product_id=product_id
+    )
 
 
 @router.get("/", response_model=List[OrderRead])
-async def read_orders(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    orders = await order_service.get_orders(db, skip=skip, limit=limit)
-    return orders
+async def read_orders(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: OrderSort = OrderSort.created_at,
+    filters: OrderFilter = Depends(order_filter),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    page = dict(skip=skip, limit=limit, cursor=cursor, filters=filters, sort=sort)
+    try:
+        if if_none_match:
+            etag = list_etag(await order_service.get_order_versions(db, **page))
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+        orders = await order_service.get_orders(db, **page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = cache_headers(list_etag((order.id, order.version) for order in orders))
+    if orders and len(orders) == limit:
+        headers[NEXT_CURSOR_HEADER] = order_service.order_cursor(orders[-1])
+    return RawJSONResponse(order_list_adapter.dump_json(orders), headers=headers)
+
+
+@router.get("/stats", response_model=OrderStats)
+async def read_order_stats(filters: OrderFilter = Depends(order_filter), db: AsyncSession = Depends(get_read_db)):
+    return await order_service.get_order_stats(db, filters=filters)
+
+
+@router.get("/export")
+async def export_orders(format: ExportFormat = ExportFormat.ndjson, db: AsyncSession = Depends(get_read_db)):
+    chunks = order_service.stream_orders(db, chunk_size=settings.EXPORT_CHUNK_SIZE)
+    if format is ExportFormat.csv:
+        chunks = order_service.flatten_order_chunks(chunks)
+    return export_service.export_response(chunks, format, order_service.ORDER_EXPORT_CSV_FIELDS, "orders")
 
 
 @router.get("/{order_id}", response_model=OrderRead)
-async def read_order(order_id: int, db: AsyncSession = Depends(get_db)):
+async def read_order(
+    order_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
     db_order = await order_service.get_order(db, order_id=order_id)
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found.")
+    etag = version_etag(db_order.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     return db_order
 
 
@@ -38,4 +152,12 @@ async def update_order_status(order_id: int, status_update: OrderUpdateStatus, d
     db_order = await order_service.get_order(db, order_id=order_id)
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found.")
-    return await order_service.update_order_status(db, db_order=db_order, status=status_update.status)
+    try:
+        return await order_service.update_order_status(db, db_order=db_order, status=status_update.status)
+    except InvalidStatusTransitionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/status-transitions", response_model=OrderStatusTransitionResult)
+async def transition_orders(transition: OrderStatusTransition, db: AsyncSession = Depends(get_db)):
+    return await order_service.bulk_transition_orders(db, order_ids=transition.order_ids, status=transition.status)
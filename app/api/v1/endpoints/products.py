@@ -1,11 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from pydantic import ValidationError
+from typing import Any, List, Optional, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.exceptions import ProductNotFoundError
-from app.schemas.product import ProductCreate, ProductRead, ProductUpdate
+from app.core.config import settings
+from app.core.etag import cache_headers, etag_matches, list_etag, not_modified, version_etag
+from app.core.exceptions import (
+    IdempotencyKeyMismatchError,
+    InsufficientStockError,
+    InvalidCursorError,
+    ProductNotFoundError,
+    VersionConflictError,
+)
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.responses import RawJSONResponse
+from app.schemas.export import ExportFormat
+from app.schemas.product import (
+    BulkUpsertStatus,
+    ProductBulkResponse,
+    ProductBulkResult,
+    ProductCreate,
+    ProductRead,
+    ProductSearchHit,
+    ProductUpdate,
+    StockAdjustmentBatch,
+    StockAdjustmentResult,
+    StockShards,
+    StockShardsRead,
+    product_list_adapter,
+    product_search_adapter,
+)
+from app.services import export as export_service
 from app.services import product as product_service
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 
 router = APIRouter()
 
@@ -19,25 +47,176 @@ async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_
     return await product_service.create_product(db, product=product)
 
 
+def _parse_bulk_body(body: bytes, content_type: str) -> List[Union[Any, ValueError]]:
+    if content_type.startswith("application/x-ndjson"):
+        records = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                records.append(e)
+        return records
+    try:
+        records = json.loads(body)
+    except ValueError:
+        records = None
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON.")
+    return records
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'body'}: {e['msg']}" for e in error.errors())
+
+
+@router.post("/bulk", response_model=ProductBulkResponse)
+async def bulk_upsert_products(
+    request: Request,
+    chunk_size: Optional[int] = Query(None, gt=0, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    records = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    products: List[Tuple[int, ProductCreate]] = []
+    results: List[ProductBulkResult] = []
+    for index, record in enumerate(records):
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            products.append((index, ProductCreate.model_validate(record)))
+        except ValidationError as e:
+            results.append(ProductBulkResult(index=index, status=BulkUpsertStatus.error, error=_validation_message(e)))
+        except ValueError as e:
+            results.append(ProductBulkResult(index=index, status=BulkUpsertStatus.error, error=f"Invalid JSON: {e}"))
+
+    results.extend(
+        await product_service.bulk_upsert_products(
+            db, products, chunk_size=chunk_size or settings.BULK_UPSERT_CHUNK_SIZE
+        )
+    )
+    results.sort(key=lambda result: result.index)
+    counts = {status_: sum(result.status is status_ for result in results) for status_ in BulkUpsertStatus}
+    return ProductBulkResponse(
+        created=counts[BulkUpsertStatus.created],
+        updated=counts[BulkUpsertStatus.updated],
+        errors=counts[BulkUpsertStatus.error],
+        results=results,
+    )
+
+
+@router.post("/stock-adjustments", response_model=StockAdjustmentResult)
+async def adjust_stock(
+    batch: StockAdjustmentBatch,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await product_service.adjust_stock(db, batch, idempotency_key=idempotency_key)
+    except ProductNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
 @router.get("/", response_model=List[ProductRead])
-async def read_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    products = await product_service.get_products(db, skip=skip, limit=limit)
-    return products
+async def read_products(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        if if_none_match:
+            # revalidate from (id, version) alone before loading and encoding the page
+            etag = list_etag(await product_service.get_product_versions(db, skip=skip, limit=limit, cursor=cursor))
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+        products = await product_service.get_products(db, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = cache_headers(list_etag((product.id, product.version) for product in products))
+    if products and len(products) == limit:
+        headers[NEXT_CURSOR_HEADER] = product_service.product_cursor(products[-1])
+    return RawJSONResponse(product_list_adapter.dump_json(products), headers=headers)
+
+
+@router.get("/export")
+async def export_products(format: ExportFormat = ExportFormat.ndjson, db: AsyncSession = Depends(get_read_db)):
+    chunks = product_service.stream_products(db, chunk_size=settings.EXPORT_CHUNK_SIZE)
+    return export_service.export_response(chunks, format, product_service.PRODUCT_EXPORT_FIELDS, "products")
+
+
+@router.get("/search", response_model=List[ProductSearchHit])
+async def search_products(
+    q: str = Query(..., min_length=product_service.SEARCH_MIN_LENGTH),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        hits = await product_service.search_products(db, q=q, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {}
+    if hits and len(hits) == limit:
+        headers[NEXT_CURSOR_HEADER] = product_service.search_cursor(hits[-1])
+    return RawJSONResponse(product_search_adapter.dump_json(hits), headers=headers)
 
 
 @router.get("/{product_id}", response_model=ProductRead)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def read_product(
+    product_id: int,
+    response: Response,
+    cache_control: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    use_cache = "no-cache" not in (cache_control or "")
     try:
-        return await product_service.get_product(db, product_id=product_id)
+        product = await product_service.get_product_data(db, product_id=product_id, use_cache=use_cache)
     except ProductNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    etag = version_etag(product["version"])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+    return product
 
 
 @router.put("/{product_id}", response_model=ProductRead)
-async def update_product(product_id: int, updates: ProductUpdate, db: AsyncSession = Depends(get_db)):
+async def update_product(
+    product_id: int,
+    updates: ProductUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        db_product = await product_service.get_product(db, product_id=product_id)
-        return await product_service.update_product(db, db_product=db_product, updates=updates)
+        expected_version = None
+        if if_match is not None:
+            current = await product_service.read_product(db, product_id=product_id)
+            if not etag_matches(if_match, version_etag(current.version), weak=False):
+                raise VersionConflictError(f"Product {product_id} is at version {current.version}.")
+            expected_version = current.version
+        product = await product_service.update_product(
+            db, product_id=product_id, updates=updates, expected_version=expected_version
+        )
+    except ProductNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except VersionConflictError as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    response.headers["ETag"] = version_etag(product.version)
+    return product
+
+
+@router.put("/{product_id}/stock-shards", response_model=StockShardsRead)
+async def set_stock_shards(product_id: int, shards: StockShards, db: AsyncSession = Depends(get_db)):
+    try:
+        return await product_service.set_stock_slots(db, product_id=product_id, slots=shards.slots)
     except ProductNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
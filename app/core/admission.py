@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence
+
+from starlette.responses import JSONResponse
+
+from app.core.metrics import Counter
+
+ORDER_CREATE_PATHS = ("/api/v1/orders", "/api/v1/orders/")
+
+# route classes in priority order: while a class has requests waiting, lower ones are shed instead of queueing
+ROUTE_CLASSES = ("orders", "writes", "reads")
+
+requests_shed = Counter(
+    "http_requests_shed_total", "Requests rejected with 503 by admission control.", labels=("route_class", "reason")
+)
+
+
+def route_class(method: str, path: str) -> str:
+    if method == "POST" and path in ORDER_CREATE_PATHS:
+        return "orders"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    return "writes"
+
+
+class AdaptiveLimit:
+    """Concurrency limit that follows latency, after the gradient algorithm of Netflix's concurrency-limits.
+
+    Each finished request compares its latency with a slow moving average. When
+    requests get slower than ``tolerance`` times that average, the database is
+    queueing work, so the limit shrinks towards ``limit * average / latency``;
+    otherwise it grows by about ``sqrt(limit)``. The limit only grows while it
+    is actually used.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, tolerance: float = 2.0,
+                 smoothing: float = 0.2, window: int = 500):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._decay = 2 / (window + 1)
+        self.long_latency: Optional[float] = None
+
+    def observe(self, latency: float, in_flight: int) -> None:
+        latency = max(latency, 1e-6)
+        if self.long_latency is None:
+            self.long_latency = latency
+        self.long_latency += (latency - self.long_latency) * self._decay
+        # after an overload the average stays high for a while; let it catch up with recovered latency
+        if self.long_latency > 2 * latency:
+            self.long_latency *= 0.95
+        if in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit += (target - self.limit) * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+
+class _RouteClassLimiter:
+    def __init__(self, limit: AdaptiveLimit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    def waiting(self) -> int:
+        return sum(not waiter.done() for waiter in self.waiters)
+
+
+class AdmissionController:
+    """Per-route-class in-flight limits, with a short deadline-bound queue in front of each.
+
+    A request over its class limit waits up to ``queue_timeout`` seconds for a
+    slot, FIFO; it is shed when the deadline passes, when ``max_queue``
+    requests already wait, or right away while a higher priority class has
+    requests waiting (see ``ROUTE_CLASSES``), as those need the database more.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, queue_timeout: float, max_queue: int,
+                 tolerance: float = 2.0, classes: Sequence[str] = ROUTE_CLASSES):
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.classes: Dict[str, _RouteClassLimiter] = {
+            name: _RouteClassLimiter(AdaptiveLimit(initial_limit, min_limit, max_limit, tolerance)) for name in classes
+        }
+
+    def _higher_priority_waiting(self, name: str) -> bool:
+        for other, limiter in self.classes.items():
+            if other == name:
+                return False
+            if limiter.waiting():
+                return True
+        return False
+
+    async def acquire(self, name: str) -> Optional[str]:
+        """Take a slot for a request of class ``name``; returns why it was shed, or ``None`` once admitted."""
+        limiter = self.classes[name]
+        if self._higher_priority_waiting(name):
+            return "priority"
+        if limiter.in_flight < limiter.limit.limit and not limiter.waiting():
+            limiter.in_flight += 1
+            return None
+        if limiter.waiting() >= self.max_queue:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        limiter.waiters.append(waiter)
+        try:
+            # the slot is handed over by release(), already counted in in_flight
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done() or waiter.cancelled():
+                return "timeout"
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot(limiter)
+            raise
+        finally:
+            if waiter in limiter.waiters:
+                limiter.waiters.remove(waiter)
+        return None
+
+    def release(self, name: str, latency: float) -> None:
+        limiter = self.classes[name]
+        limiter.limit.observe(latency, limiter.in_flight)
+        self._free_slot(limiter)
+
+    def _free_slot(self, limiter: _RouteClassLimiter) -> None:
+        limiter.in_flight -= 1
+        while limiter.waiters and limiter.in_flight < limiter.limit.limit:
+            waiter = limiter.waiters.popleft()
+            if not waiter.done():
+                limiter.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            "limit": {name: round(limiter.limit.limit, 2) for name, limiter in self.classes.items()},
+            "in_flight": {name: limiter.in_flight for name, limiter in self.classes.items()},
+            "waiting": {name: limiter.waiting() for name, limiter in self.classes.items()},
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding load with ``503`` and ``Retry-After`` through an ``AdmissionController``.
+
+    Paths starting with one of ``excluded_paths`` (metrics, long polls, streaming
+    exports) are never limited, and their latency never feeds the limits.
+    """
+
+    def __init__(self, app, controller: AdmissionController, retry_after: int, excluded_paths: Sequence[str] = ()):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["method"], scope["path"])
+        reason = await self.controller.acquire(name)
+        if reason is not None:
+            requests_shed.inc(name, reason)
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry."},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name, time.perf_counter() - started)
@@ -0,0 +1,109 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Set, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BatchRunner = Callable[[Any, List[T]], Awaitable[List[Union[R, Exception]]]]
+
+_RESUBMIT = object()
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.full = asyncio.Event()
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collect items submitted within ``window`` seconds, up to ``max_size``, and run them as one batch.
+
+    The first caller of a batch leads it: it waits for the window to pass (or the
+    batch to fill up), then calls ``run_batch(db, items)`` with its own session.
+    The other callers only wait for their result, so they never touch their
+    sessions. ``run_batch`` returns one result or exception per item, in order;
+    each caller gets its own. If the batch as a whole fails, every caller gets
+    that exception. If the leader is cancelled during the window, the others
+    submit again; once the batch runs, the leader waits for it to finish before
+    it is cancelled, as the batch uses its session. Followers cancelled before
+    the batch runs are left out of it; a follower cancelled while it runs only
+    stops waiting, and its item is still part of the batch.
+    """
+
+    def __init__(self, run_batch: BatchRunner, window: float, max_size: int):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self._batch: Optional[_PendingBatch] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, db, item: T) -> R:
+        while True:
+            result = await self._submit_once(db, item)
+            if result is not _RESUBMIT:
+                return result
+
+    async def _submit_once(self, db, item: T):
+        batch = self._batch
+        if batch is None:
+            batch = self._batch = _PendingBatch()
+        future = asyncio.get_running_loop().create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_size:
+            # later callers start the next batch while this one runs
+            self._batch = None
+            batch.full.set()
+        if len(batch.items) == 1:
+            await self._lead(db, batch)
+        return await future
+
+    async def _lead(self, db, batch: _PendingBatch) -> None:
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # cancelled before anything was written; the others join a new batch
+            for future in batch.futures[1:]:
+                future.set_result(_RESUBMIT)
+            raise
+        finally:
+            if self._batch is batch:
+                self._batch = None
+        # once started the batch runs to the end, as the others wait for it; the leader keeps its session open until then
+        task = asyncio.ensure_future(self._run(db, batch))
+        self._running.add(task)
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            while not task.done():
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    async def _run(self, db, batch: _PendingBatch) -> None:
+        # callers that gave up during the window get nothing, so their items are not run
+        pending = [(item, future) for item, future in zip(batch.items, batch.futures) if not future.done()]
+        items = [item for item, _ in pending]
+        futures = [future for _, future in pending]
+        try:
+            results = await self.run_batch(db, items)
+        except Exception as e:
+            results = [e] * len(items)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            self._running.discard(asyncio.current_task())
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
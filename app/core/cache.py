@@ -0,0 +1,151 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - redis is optional
+    redis_asyncio = None
+
+
+class CacheBackend(ABC):
+    """A key/value store for JSON-serializable values with per-entry TTL."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    async def clear(self) -> None:
+        ...
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache; expired entries are dropped lazily on access."""
+
+    def __init__(self, max_size: int = 10_000, clock=time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class InMemoryBackend(LRUCache):
+    """Stand-in for a shared backend in tests; values round-trip through JSON like Redis."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await super().get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await super().set(key, json.dumps(value), ttl)
+
+
+class RedisBackend(CacheBackend):
+    """Shared cache backed by Redis; requires the optional ``redis`` package."""
+
+    def __init__(self, url: str, prefix: str = "warehouse:"):
+        if redis_asyncio is None:
+            raise RuntimeError("The redis package is required for RedisBackend.")
+        self._client = redis_asyncio.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(self._prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(self._prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._client.delete(*(self._prefix + key for key in keys))
+
+
+class TieredCache:
+    """Read-through cache: an in-process LRU in front of an optional shared backend."""
+
+    def __init__(self, local: LRUCache, shared: Optional[CacheBackend] = None, ttl: float = 5.0, enabled: bool = True):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        value = await self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                self.shared_hits += 1
+                await self.local.set(key, value, self.ttl)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        await self.local.set(key, value, self.ttl)
+        if self.shared is not None:
+            await self.shared.set(key, value, self.ttl)
+
+    async def delete(self, *keys: str) -> None:
+        await self.local.delete(*keys)
+        if self.shared is not None:
+            await self.shared.delete(*keys)
+
+    async def clear(self) -> None:
+        await self.local.clear()
+        if self.shared is not None:
+            await self.shared.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "size": len(self.local),
+        }
@@ -1,13 +1,74 @@
 from pydantic import Field
+from typing import Dict, List, Literal, Optional
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
 
 class Settings(BaseSettings):
-    DATABASE_URL: str = Field(..., json_schema_extra={"env": "DATABASE_URL"})
-    DATABASE_URL_TEST: str = Field(..., json_schema_extra={"env": "DATABASE_URL_TEST"})
+    DATABASE_URL: str = Field("sqlite+aiosqlite:///./warehouse.db", json_schema_extra={"env": "DATABASE_URL"})
+    DATABASE_URL_TEST: str = Field(
+        "sqlite+aiosqlite:///./warehouse_test.db", json_schema_extra={"env": "DATABASE_URL_TEST"}
+    )
+    DB_CREATE_ALL: bool = True
+    DATABASE_READ_URL: Optional[str] = None
+    DATABASE_READ_BALANCING: Literal["round_robin", "least_connections"] = "round_robin"
+    DATABASE_READ_RETRY_AFTER: float = 30.0
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_CONFLICT_MAX_RETRIES: int = 5
+    DB_CONFLICT_RETRY_BACKOFF: float = 0.01
+    EXPORT_CHUNK_SIZE: int = 1000
+    BULK_UPSERT_CHUNK_SIZE: int = 1000
+    STOCK_ADJUSTMENT_CHUNK_SIZE: int = 1000
+    ORDER_BATCH_ENABLED: bool = False
+    ORDER_BATCH_WINDOW: float = 0.003
+    ORDER_BATCH_MAX_SIZE: int = 32
+    ORDER_INTAKE_WORKERS: int = 0
+    ORDER_INTAKE_BATCH_SIZE: int = 20
+    ORDER_INTAKE_POLL_INTERVAL: float = 1.0
+    PRODUCT_CACHE_ENABLED: bool = True
+    PRODUCT_CACHE_MAX_SIZE: int = 10_000
+    PRODUCT_CACHE_TTL_SECONDS: float = 5.0
+    PRODUCT_CACHE_REDIS_URL: Optional[str] = None
+    HTTP_CACHE_CONTROL: str = "no-cache"
+    ADMISSION_CONTROL_ENABLED: bool = False
+    ADMISSION_INITIAL_LIMIT: int = 20
+    ADMISSION_MIN_LIMIT: int = 2
+    ADMISSION_MAX_LIMIT: int = 200
+    ADMISSION_LATENCY_TOLERANCE: float = 2.0
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5
+    ADMISSION_MAX_QUEUE: int = 100
+    ADMISSION_RETRY_AFTER: int = 1
+    ADMISSION_EXCLUDED_PATHS: List[str] = [
+        "/metrics", "/api/v1/events", "/api/v1/products/export", "/api/v1/orders/export"
+    ]
+    METRICS_ENABLED: bool = True
+    METRICS_SLOW_REQUEST_SECONDS: Optional[float] = None
+    QUERY_BUDGET_SAMPLE_RATE: float = 0.0
+    QUERY_BUDGET_DEFAULT: int = 20
+    QUERY_BUDGETS: Dict[str, int] = {}
+    IDEMPOTENCY_KEY_TTL_SECONDS: float = 24 * 3600
+    IDEMPOTENCY_PURGE_INTERVAL: float = 3600
+    OUTBOX_SINK: Optional[Literal["file", "webhook"]] = None
+    OUTBOX_FILE_PATH: str = "outbox.ndjson"
+    OUTBOX_WEBHOOK_URL: Optional[str] = None
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_RETENTION_SECONDS: float = 7 * 24 * 3600
+    EVENTS_VISIBILITY_DELAY: float = 0.5
+    EVENTS_MAX_WAIT: float = 30.0
+
     class Config:
         env_file = Path(__file__).resolve().parent.parent.parent / ".env"
 
+    @property
+    def database_read_urls(self) -> List[str]:
+        """Replica URLs from the comma-separated ``DATABASE_READ_URL``."""
+        return [url.strip() for url in (self.DATABASE_READ_URL or "").split(",") if url.strip()]
+
 
 settings = Settings()
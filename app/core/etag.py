@@ -0,0 +1,42 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Response
+
+from app.core.config import settings
+
+
+def version_etag(version: int) -> str:
+    return f'"v{version}"'
+
+
+def list_etag(keys: Iterable[Tuple[int, int]]) -> str:
+    """Strong ETag of a page from the ``(id, version)`` of its rows, in page order."""
+    digest = hashlib.sha256(",".join(f"{id_}:{version}" for id_, version in keys).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _parse_tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Whether ``If-None-Match`` (``weak=True``) or ``If-Match`` (``weak=False``) matches ``etag``.
+
+    ``If-None-Match`` uses the weak comparison, so ``W/"v1"`` matches ``"v1"``;
+    ``If-Match`` never matches a weak tag.
+    """
+    if not header:
+        return False
+    tags = _parse_tags(header)
+    if weak:
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return "*" in tags or etag in tags
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": settings.HTTP_CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
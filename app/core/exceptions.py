@@ -11,3 +11,33 @@ class ProductNotFoundError(Exception):
 class OrderNotFoundError(Exception):
     """Exception raised when an order is not found."""
     pass
+
+
+class StockReservationConflictError(Exception):
+    """Exception raised when stock could not be reserved because of concurrent updates."""
+    pass
+
+
+class InvalidCursorError(Exception):
+    """Exception raised when a pagination cursor cannot be decoded."""
+    pass
+
+
+class IdempotencyKeyMismatchError(Exception):
+    """Exception raised when an idempotency key is reused with a different request."""
+    pass
+
+
+class InvalidStatusTransitionError(Exception):
+    """Exception raised when an order cannot move to the requested status."""
+    pass
+
+
+class QueryBudgetExceededError(Exception):
+    """Exception raised when a block executes more SQL statements than its query budget allows."""
+    pass
+
+
+class VersionConflictError(Exception):
+    """Exception raised when a resource changed since the version a conditional request was made against."""
+    pass
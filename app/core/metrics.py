@@ -0,0 +1,331 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.core.exceptions import QueryBudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROW_COUNT_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000)
+QUEUE_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label combination."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            # per-bucket counts followed by sum and count
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            bucket_counts = series[:len(self.buckets)] + [series[-1] - sum(series[:len(self.buckets)])]
+            for bound, count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+        return lines
+
+
+def render_gauges(name: str, help: str, values: Dict[str, float], label: Optional[str] = None, type: str = "gauge") -> List[str]:
+    """Render ``values`` as one metric labelled by key, or as ``{name}_{key}`` metrics without ``label``."""
+    lines = []
+    if label is not None:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+        lines += [f"{name}{_format_labels((label,), (key,))} {_format_value(value)}" for key, value in values.items()]
+        return lines
+    for key, value in values.items():
+        metric = f"{name}_{key}"
+        lines += [f"# HELP {metric} {help} ({key})", f"# TYPE {metric} {type}", f"{metric} {_format_value(value)}"]
+    return lines
+
+
+class QueryStats:
+    """Statements executed while this recorder was active."""
+
+    def __init__(self, capture_statements: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.capture_statements = capture_statements
+        self.statements: List[Tuple[str, float]] = []
+
+    def observe(self, statement: str, seconds: float, rows: int = 0) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.rows += rows
+        if self.capture_statements:
+            self.statements.append((statement, seconds))
+
+
+_active_stats: contextvars.ContextVar[Tuple[QueryStats, ...]] = contextvars.ContextVar("active_query_stats", default=())
+
+
+@contextmanager
+def record_queries(stats: QueryStats) -> Iterator[QueryStats]:
+    """Feed every statement the current task executes into ``stats`` until the block exits.
+
+    The SQLAlchemy async greenlets run with the calling task's context, so
+    statements issued through ``AsyncSession`` are attributed to the task that
+    awaited them. Recorders nest; every active recorder sees every statement.
+    """
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+def format_statements(stats: QueryStats) -> str:
+    return "\n".join(f"[{seconds * 1000:.1f}ms] {statement}" for statement, seconds in stats.statements)
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Raise ``QueryBudgetExceededError`` if the block executes more than ``max_queries`` statements.
+
+    Meant for tests pinning how many statements an endpoint call may issue, so an
+    accidental N+1 relationship load fails loudly.
+    """
+    with record_queries(QueryStats(capture_statements=True)) as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise QueryBudgetExceededError(
+            f"{stats.count} SQL statements executed, budget is {max_queries}:\n{format_statements(stats)}"
+        )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if _active_stats.get():
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+# nested-transaction bookkeeping, e.g. from the per-test SAVEPOINTs; not a query the code asked for
+SAVEPOINT_STATEMENTS = ("SAVEPOINT ", "RELEASE SAVEPOINT ", "ROLLBACK TO SAVEPOINT ")
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    active = _active_stats.get()
+    started = conn.info.get("query_started")
+    if not active or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if statement.startswith(SAVEPOINT_STATEMENTS):
+        return
+    # SELECT rows are counted by _count_fetched_rows, as drivers report -1 for them
+    dml = context is not None and (context.isinsert or context.isupdate or context.isdelete)
+    rows = cursor.rowcount if dml and cursor.rowcount and cursor.rowcount > 0 else 0
+    for stats in active:
+        stats.observe(statement, seconds, rows)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_query_timer(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None:
+        context.connection.info.pop("query_started", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_fetched_rows(orm_execute_state: ORMExecuteState):
+    """Count the rows ``SELECT`` statements run through a ``Session`` return.
+
+    ``cursor.rowcount`` is -1 for ``SELECT`` on aiosqlite and asyncpg, so the
+    result is buffered and its rows counted instead. Streamed results are not
+    buffered and not counted, nor are selects executed on a bare connection.
+    """
+    active = _active_stats.get()
+    options = orm_execute_state.execution_options
+    if not active or not orm_execute_state.is_select or options.get("stream_results") or options.get("yield_per"):
+        return None
+    frozen = orm_execute_state.invoke_statement().freeze()
+    for stats in active:
+        stats.rows += len(frozen.data)
+    return frozen()
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", labels=("method", "route", "status")
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", labels=("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_query_seconds_per_request = Histogram(
+    "db_query_seconds_per_request", "Time spent executing SQL per HTTP request.", labels=("method", "route")
+)
+db_rows_per_request = Histogram(
+    "db_rows_per_request", "Rows returned by SQL statements per HTTP request.", labels=("method", "route"),
+    buckets=ROW_COUNT_BUCKETS,
+)
+
+query_budget_exceeded = Counter(
+    "db_query_budget_exceeded_total", "Sampled requests that executed more SQL statements than their route budget.",
+    labels=("method", "route"),
+)
+
+order_intake_lag = Histogram(
+    "order_intake_lag_seconds", "Time from queueing an order to a worker creating or rejecting it.",
+    labels=("status",), buckets=QUEUE_LAG_BUCKETS,
+)
+
+REQUEST_HISTOGRAMS = (http_request_duration, db_queries_per_request, db_query_seconds_per_request, db_rows_per_request)
+REQUEST_METRICS = REQUEST_HISTOGRAMS + (query_budget_exceeded,)
+
+
+def route_template(scope) -> str:
+    """The path template of the matched route, so ``/orders/1`` and ``/orders/2`` share a series."""
+    route = scope.get("route")
+    if getattr(route, "path_regex", None) is None:
+        return "unmatched"
+    # routes of included routers only know their path relative to the router prefix
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route.
+
+    With ``slow_request_seconds`` set, the SQL of every request slower than that
+    is logged at WARNING level; statements are only captured in that mode.
+    """
+
+    def __init__(self, app, slow_request_seconds: Optional[float] = None):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = QueryStats(capture_statements=self.slow_request_seconds is not None)
+        started = time.perf_counter()
+        try:
+            with record_queries(stats):
+                await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            method, route = scope["method"], route_template(scope)
+            http_request_duration.observe(elapsed, method, route, str(status_code))
+            db_queries_per_request.observe(stats.count, method, route)
+            db_query_seconds_per_request.observe(stats.seconds, method, route)
+            db_rows_per_request.observe(stats.rows, method, route)
+            if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds:
+                logger.warning(
+                    "Slow request %s %s took %.3fs with %d queries (%.3fs in SQL):\n%s",
+                    method, scope["path"], elapsed, stats.count, stats.seconds,
+                    format_statements(stats),
+                )
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that checks a sample of requests against per-route query budgets.
+
+    ``budgets`` maps ``"METHOD /route/template"`` to the statements a request may
+    execute, falling back to ``default_budget``. Sampled requests over budget are
+    logged with their SQL and counted in ``db_query_budget_exceeded_total``.
+    """
+
+    def __init__(self, app, budgets: Dict[str, int], default_budget: int, sample_rate: float,
+                 sampler: Callable[[], float] = random.random):
+        self.app = app
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.sample_rate = sample_rate
+        self._sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._sampler() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(capture_statements=True)
+        try:
+            with record_queries(stats):
+                await self.app(scope, receive, send)
+        finally:
+            method, route = scope["method"], route_template(scope)
+            budget = self.budgets.get(f"{method} {route}", self.default_budget)
+            if stats.count > budget:
+                query_budget_exceeded.inc(method, route)
+                logger.warning(
+                    "Request %s %s executed %d SQL statements, budget for %s is %d:\n%s",
+                    method, scope["path"], stats.count, route, budget, format_statements(stats),
+                )
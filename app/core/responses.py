@@ -0,0 +1,7 @@
+from fastapi import Response
+
+
+class RawJSONResponse(Response):
+    """JSON response for a body that is already encoded, e.g. by ``TypeAdapter.dump_json``."""
+
+    media_type = "application/json"
@@ -0,0 +1,45 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# connection execution option read by the SQLite "begin" hook in ``app.db.session``
+SQLITE_BEGIN_IMMEDIATE = "sqlite_begin_immediate"
+
+
+def dialect_name(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+
+def upsert_insert(db: AsyncSession, table):
+    """Return an ``INSERT`` construct supporting ``on_conflict_do_*`` for the session's dialect."""
+    if dialect_name(db) == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+async def begin_write(db: AsyncSession) -> None:
+    """Start the session's transaction holding the database write lock on SQLite.
+
+    SQLite ignores ``SELECT ... FOR UPDATE``. A deferred transaction that reads and
+    then writes fails with "database is locked" when another writer got in between.
+    ``BEGIN IMMEDIATE`` makes writers queue up front instead. Call it before the
+    transaction's first statement. On other databases it does nothing, as row locks
+    come from ``FOR UPDATE``.
+    """
+    if dialect_name(db) == "sqlite":
+        await db.connection(execution_options={SQLITE_BEGIN_IMMEDIATE: True})
+
+
+def include_object_for(dialect: str):
+    """Return an Alembic ``include_object`` hook for comparing the schema on ``dialect``.
+
+    Schema items limited to other databases with ``.ddl_if(dialect=...)``, such as
+    the PostgreSQL trigram indexes, are skipped, as ``create_all`` skips them too.
+    """
+    def include_object(obj, name, type_, reflected, compare_to):
+        ddl_if = getattr(obj, "_ddl_if", None)
+        if ddl_if is None or ddl_if.dialect is None:
+            return True
+        dialects = (ddl_if.dialect,) if isinstance(ddl_if.dialect, str) else ddl_if.dialect
+        return dialect in dialects
+
+    return include_object
@@ -0,0 +1,48 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, Tuple, Type, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# serialization_failure and deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+def is_retryable(exc: DBAPIError) -> bool:
+    if getattr(exc.orig, "sqlstate", None) in RETRYABLE_SQLSTATES:
+        return True
+    # SQLite reports lock conflicts between writers as SQLITE_BUSY
+    return "database is locked" in str(exc.orig)
+
+
+async def run_with_retries(
+    operation: Callable[[], Awaitable[T]],
+    retry_on: Tuple[Type[Exception], ...] = (),
+    max_retries: int = None,
+    backoff: float = None,
+) -> T:
+    """Await ``operation()``, running it again after lock conflicts.
+
+    ``operation`` must run its own transaction so that every attempt starts from a
+    clean session. Retryable database errors and exceptions listed in ``retry_on``
+    are retried with jittered exponential backoff; the last one is re-raised once
+    ``max_retries`` (default ``DB_CONFLICT_MAX_RETRIES``) is exhausted.
+    """
+    if max_retries is None:
+        max_retries = settings.DB_CONFLICT_MAX_RETRIES
+    if backoff is None:
+        backoff = settings.DB_CONFLICT_RETRY_BACKOFF
+    for attempt in range(max_retries + 1):
+        try:
+            return await operation()
+        except DBAPIError as e:
+            if not is_retryable(e) or attempt == max_retries:
+                raise
+        except retry_on:
+            if attempt == max_retries:
+                raise
+        await asyncio.sleep(backoff * (2 ** attempt) * random.random())
@@ -1,16 +1,121 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.db.dialect import SQLITE_BEGIN_IMMEDIATE
+
+
+class PoolMetrics:
+    """Counters for how long checkouts wait for a pooled connection."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+        self.timeouts = 0
+
+    def observe_acquire(self, seconds: float) -> None:
+        self.acquired += 1
+        self.acquire_seconds_total += seconds
+        self.acquire_seconds_max = max(self.acquire_seconds_max, seconds)
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait time and pool timeouts."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.observe_acquire(time.perf_counter() - started)
+        return connection
+
+
+def pool_status(engine: AsyncEngine) -> Dict[str, Any]:
+    """Current pool occupancy plus the checkout counters of a ``MeteredQueuePool``."""
+    pool = engine.sync_engine.pool
+    status = {}
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(vars(metrics))
+    return status
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "poolclass": MeteredQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+    return options
+
+
+def configure_sqlite(engine: AsyncEngine) -> None:
+    """Make SQLite behave like the Postgres deployment where the services depend on it.
+
+    Foreign keys are enforced and file databases use WAL so readers do not block
+    the writer. pysqlite's implicit transaction handling is replaced by explicit
+    ``BEGIN`` statements, which makes SAVEPOINTs work and lets write
+    transactions start with ``BEGIN IMMEDIATE`` (see ``dialect.begin_write``).
+    """
+    in_memory = engine.url.database in (None, "", ":memory:")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_begin(conn):
+        # straight to the driver, like the BEGIN other drivers send implicitly, so it is not counted as a query
+        cursor = conn.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE" if conn.get_execution_options().get(SQLITE_BEGIN_IMMEDIATE) else "BEGIN")
+        cursor.close()
 
 
 def get_engine(database_url: str = None):
     if database_url is None:
         database_url = settings.DATABASE_URL
-    return create_async_engine(
+    engine = create_async_engine(
         database_url,
         echo=False,
         future=True,
+        **engine_options(database_url),
     )
+    if engine.dialect.name == "sqlite":
+        configure_sqlite(engine)
+    return engine
 
 
 def get_sessionmaker(engine):
@@ -27,6 +132,79 @@ def get_db(sessionmaker):
     return _get_db
 
 
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+
+class ReadReplicaRouter:
+    """Picks a read replica per request and takes failing replicas out of rotation.
+
+    ``strategy`` is ``round_robin`` or ``least_connections`` (fewest checked-out
+    pool connections). A replica that fails to connect is skipped for
+    ``retry_after`` seconds.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], strategy: str = "round_robin", retry_after: float = 30.0,
+                 clock=time.monotonic):
+        self.engines = engines
+        self.sessionmakers = [get_sessionmaker(engine) for engine in engines]
+        self.strategy = strategy
+        self.retry_after = retry_after
+        self._clock = clock
+        self._down_until = [0.0] * len(engines)
+        self._counter = itertools.count()
+
+    def candidates(self) -> List[Tuple[int, sessionmaker]]:
+        now = self._clock()
+        available = [index for index in range(len(self.engines)) if self._down_until[index] <= now]
+        if self.strategy == "least_connections":
+            available.sort(key=lambda index: self.engines[index].sync_engine.pool.checkedout())
+        elif available:
+            start = next(self._counter) % len(available)
+            available = available[start:] + available[:start]
+        return [(index, self.sessionmakers[index]) for index in available]
+
+    def mark_down(self, index: int) -> None:
+        self._down_until[index] = self._clock() + self.retry_after
+
+
+def wants_primary(request: Request) -> bool:
+    return request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary"
+
+
+def read_db_dependency(sessionmaker, router: Optional[ReadReplicaRouter]):
+    """Session dependency for read-only endpoints.
+
+    Routes to a replica when any are configured, falling back to the primary when
+    none is reachable or the client sends ``X-Read-Consistency: primary`` to read
+    its own writes.
+    """
+    async def _get_read_db(request: Request):
+        if router is not None and not wants_primary(request):
+            for index, replica_sessionmaker in router.candidates():
+                session = replica_sessionmaker()
+                try:
+                    await session.connection()
+                except (OSError, SQLAlchemyError):
+                    await session.close()
+                    router.mark_down(index)
+                    continue
+                try:
+                    yield session
+                finally:
+                    await session.close()
+                return
+        async with sessionmaker() as session:
+            yield session
+
+    return _get_read_db
+
+
 engine = get_engine()
 AsyncSessionLocal = get_sessionmaker(engine)
 get_db = get_db(AsyncSessionLocal)
+read_router = ReadReplicaRouter(
+    [get_engine(url) for url in settings.database_read_urls],
+    strategy=settings.DATABASE_READ_BALANCING,
+    retry_after=settings.DATABASE_READ_RETRY_AFTER,
+) if settings.database_read_urls else None
+get_read_db = read_db_dependency(AsyncSessionLocal, read_router)
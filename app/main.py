@@ -1,20 +1,70 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 import uvicorn
 from fastapi import FastAPI
+from app.api import metrics
 from app.api.v1.api import api_router
+from app.core.admission import AdmissionController, AdmissionMiddleware
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, QueryBudgetMiddleware
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import AsyncSessionLocal, engine
+from app.services.idempotency import purge_expired_keys_periodically
+from app.services.order_intake import OrderIntakeWorkers
+from app.services.outbox import OutboxDispatcher, sink_from_settings
 
 
 def create_app() -> FastAPI:
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        if settings.DB_CREATE_ALL:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        dispatcher = OutboxDispatcher(AsyncSessionLocal, sink_from_settings())
+        dispatcher.start()
+        app.state.outbox_dispatcher = dispatcher
+        intake_workers = OrderIntakeWorkers(AsyncSessionLocal)
+        if settings.ORDER_INTAKE_WORKERS > 0:
+            intake_workers.start()
+            app.state.order_intake_workers = intake_workers
+        purge_task = asyncio.create_task(
+            purge_expired_keys_periodically(AsyncSessionLocal, settings.IDEMPOTENCY_PURGE_INTERVAL)
+        )
         yield
+        purge_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await purge_task
+        await intake_workers.stop()
+        await dispatcher.stop()
 
     app = FastAPI(title="Warehouse Management API", lifespan=lifespan)
     app.include_router(api_router, prefix="/api/v1")
+    if settings.QUERY_BUDGET_SAMPLE_RATE > 0:
+        app.add_middleware(
+            QueryBudgetMiddleware,
+            budgets=settings.QUERY_BUDGETS,
+            default_budget=settings.QUERY_BUDGET_DEFAULT,
+            sample_rate=settings.QUERY_BUDGET_SAMPLE_RATE,
+        )
+    if settings.ADMISSION_CONTROL_ENABLED:
+        # added before the metrics middleware, so shed requests still show up in its histograms
+        app.state.admission = AdmissionController(
+            initial_limit=settings.ADMISSION_INITIAL_LIMIT,
+            min_limit=settings.ADMISSION_MIN_LIMIT,
+            max_limit=settings.ADMISSION_MAX_LIMIT,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            tolerance=settings.ADMISSION_LATENCY_TOLERANCE,
+        )
+        app.add_middleware(
+            AdmissionMiddleware,
+            controller=app.state.admission,
+            retry_after=settings.ADMISSION_RETRY_AFTER,
+            excluded_paths=settings.ADMISSION_EXCLUDED_PATHS,
+        )
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware, slow_request_seconds=settings.METRICS_SLOW_REQUEST_SECONDS)
+        app.include_router(metrics.router)
     return app
 
 
@@ -1,3 +1,7 @@
 from .product import Product
 from .order import Order
 from .order_item import OrderItem
+from .idempotency_key import IdempotencyKey
+from .outbox_event import OutboxEvent
+from .stock_shard import StockShard
+from .order_intake import OrderIntake
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, DateTime, Enum as SQLEnum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
@@ -11,9 +11,23 @@ class Order(Base):
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(SQLEnum(OrderStatus), default=OrderStatus.in_progress, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     items = relationship(
         "OrderItem",
         back_populates="order",
         cascade="all, delete-orphan",
         lazy="selectin"
     )
+
+    __table_args__ = (
+        # keyset pagination and date-range scans
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        # active orders are a small, hot subset of the table
+        Index(
+            "ix_orders_in_progress_created_at",
+            "created_at",
+            postgresql_where=status == OrderStatus.in_progress,
+            sqlite_where=status == OrderStatus.in_progress,
+        ),
+    )
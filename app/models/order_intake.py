@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Enum as SQLEnum, ForeignKey, Index
+from datetime import datetime
+from app.db.base import Base
+from app.schemas.order import OrderIntakeStatus
+
+
+class OrderIntake(Base):
+    __tablename__ = "order_intake"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(SQLEnum(OrderIntakeStatus), default=OrderIntakeStatus.queued, nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    error = Column(String, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # workers only ever scan orders that are still queued
+        Index(
+            "ix_order_intake_queued",
+            "id",
+            postgresql_where=status == OrderIntakeStatus.queued,
+            sqlite_where=status == OrderIntakeStatus.queued,
+        ),
+    )
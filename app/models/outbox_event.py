@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+from app.db.base import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    event_type = Column(String, nullable=False)
+    aggregate_type = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # the dispatcher only ever scans events that are still pending
+        Index(
+            "ix_outbox_events_pending",
+            "id",
+            postgresql_where=dispatched_at.is_(None),
+            sqlite_where=dispatched_at.is_(None),
+        ),
+    )
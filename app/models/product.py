@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import DDL, Column, Float, Index, Integer, String, event, func
 from app.db.base import Base
 
 class Product(Base):
@@ -9,3 +9,32 @@ class Product(Base):
     description = Column(String, nullable=True)
     price = Column(Float, nullable=False)
     quantity = Column(Integer, nullable=False, default=0)
+    # bumped by every write; the source of ETags and If-Match checks
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # > 0 when the stock lives in that many ``product_stock_shards`` slots instead of ``quantity``
+    stock_slots = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # substring and fuzzy search; SQLite has no trigram indexes and scans instead
+        Index(
+            "ix_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# exact and prefix tiers of product search; text_pattern_ops serves LIKE 'prefix%' in any collation
+Index(
+    "ix_products_name_lower",
+    func.lower(Product.name).label("name_lower"),
+    postgresql_ops={"name_lower": "text_pattern_ops"},
+)
+
+event.listen(
+    Product.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
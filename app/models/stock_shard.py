@@ -0,0 +1,16 @@
+from sqlalchemy import CheckConstraint, Column, ForeignKey, Integer
+from app.db.base import Base
+
+
+class StockShard(Base):
+    """One counter slot of a product whose stock is split across several rows."""
+
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    # summed into the product's version, so stock changes move its ETag without writing the product row
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (CheckConstraint("quantity >= 0", name="ck_product_stock_shards_quantity"),)
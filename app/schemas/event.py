@@ -0,0 +1,14 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict
+from datetime import datetime
+
+
+class EventRead(BaseModel):
+    id: int
+    created_at: datetime
+    event_type: str
+    aggregate_type: str
+    aggregate_id: int
+    payload: Dict[str, Any]
+
+    model_config = ConfigDict(from_attributes=True)
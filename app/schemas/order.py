@@ -1,7 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Dict, List, Literal, Optional
+from datetime import date, datetime
 from .order_item import OrderItemCreate, OrderItemRead
 
 
@@ -12,23 +12,82 @@ class OrderStatus(str, Enum):
     cancelled = "cancelled"
 
 
+class OrderIntakeStatus(str, Enum):
+    queued = "queued"
+    completed = "completed"
+    failed = "failed"
+
+
+class OrderSort(str, Enum):
+    created_at = "created_at"
+    created_at_desc = "-created_at"
+
+
+class OrderFilter(BaseModel):
+    status: Optional[List[OrderStatus]] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    product_id: Optional[int] = None
+
+
 class OrderBase(BaseModel):
     status: OrderStatus = OrderStatus.in_progress
 
 
 class OrderCreate(BaseModel):
-    status: OrderStatus = OrderStatus.in_progress
-    items: List[OrderItemCreate]
+    # orders start in progress; other statuses are only reached through ALLOWED_TRANSITIONS
+    status: Literal[OrderStatus.in_progress] = OrderStatus.in_progress
+    items: List[OrderItemCreate] = Field(..., min_length=1)
 
 
 class OrderUpdateStatus(BaseModel):
     status: OrderStatus
 
 
+class OrderStatusTransition(BaseModel):
+    order_ids: List[int] = Field(..., min_length=1)
+    status: OrderStatus
+
+
+class OrderStatusTransitionResult(BaseModel):
+    status: OrderStatus
+    transitioned: List[int]
+    rejected: List[int]
+
+
 class OrderRead(BaseModel):
     id: int
     created_at: datetime
     status: OrderStatus
+    # defaulted so responses stored before versions existed still validate
+    version: int = 1
     items: List[OrderItemRead]
 
     model_config = ConfigDict(from_attributes=True)
+
+
+order_list_adapter = TypeAdapter(List[OrderRead])
+
+
+class OrderIntakeRead(BaseModel):
+    id: int
+    created_at: datetime
+    status: OrderIntakeStatus
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ProductDailySales(BaseModel):
+    day: date
+    product_id: int
+    product_name: str
+    units: int
+    revenue: float
+
+
+class OrderStats(BaseModel):
+    by_status: Dict[OrderStatus, int]
+    products: List[ProductDailySales]
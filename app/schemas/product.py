@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional
+from enum import Enum
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import List, Optional
 
 
 class ProductBase(BaseModel):
@@ -22,5 +23,65 @@ class ProductUpdate(BaseModel):
 
 class ProductRead(ProductBase):
     id: int
+    version: int = 1
 
     model_config = ConfigDict(from_attributes=True)
+
+
+product_list_adapter = TypeAdapter(List[ProductRead])
+
+
+class ProductSearchHit(ProductRead):
+    score: float
+
+
+product_search_adapter = TypeAdapter(List[ProductSearchHit])
+
+
+class BulkUpsertStatus(str, Enum):
+    created = "created"
+    updated = "updated"
+    error = "error"
+
+
+class ProductBulkResult(BaseModel):
+    index: int
+    status: BulkUpsertStatus
+    id: Optional[int] = None
+    name: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ProductBulkResponse(BaseModel):
+    created: int
+    updated: int
+    errors: int
+    results: List[ProductBulkResult]
+
+
+class StockAdjustment(BaseModel):
+    product_id: int
+    delta: int
+
+
+class StockAdjustmentBatch(BaseModel):
+    adjustments: List[StockAdjustment] = Field(..., min_length=1)
+
+
+class StockLevel(BaseModel):
+    product_id: int
+    quantity: int
+
+
+class StockAdjustmentResult(BaseModel):
+    replayed: bool = False
+    products: List[StockLevel]
+
+
+class StockShards(BaseModel):
+    slots: int = Field(..., ge=0, le=64)
+
+
+class StockShardsRead(StockShards):
+    product_id: int
+    quantities: List[int]
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterable, List
+
+from fastapi.responses import StreamingResponse
+
+from app.schemas.export import ExportFormat
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def to_ndjson(records: Iterable[Dict[str, Any]]) -> bytes:
+    return b"".join(
+        json.dumps(record, default=_json_default, separators=(",", ":")).encode() + b"\n"
+        for record in records
+    )
+
+
+def to_csv(records: Iterable[Dict[str, Any]], fields: List[str], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    for record in records:
+        writer.writerow([_csv_value(record.get(field)) for field in fields])
+    return buffer.getvalue().encode()
+
+
+async def render(
+    chunks: AsyncIterator[List[Dict[str, Any]]], export_format: ExportFormat, csv_fields: List[str]
+) -> AsyncIterator[bytes]:
+    """Encode each chunk of records as it arrives so only one chunk is held in memory."""
+    if export_format is ExportFormat.csv:
+        yield to_csv((), csv_fields, header=True)
+    async for records in chunks:
+        if export_format is ExportFormat.csv:
+            yield to_csv(records, csv_fields)
+        else:
+            yield to_ndjson(records)
+
+
+def export_response(
+    chunks: AsyncIterator[List[Dict[str, Any]]],
+    export_format: ExportFormat,
+    csv_fields: List[str],
+    filename: str,
+) -> StreamingResponse:
+    return StreamingResponse(
+        render(chunks, export_format, csv_fields),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'},
+    )
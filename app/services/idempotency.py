@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import json
+import logging
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import IdempotencyKeyMismatchError
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+_locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def request_hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def key_lock(scope: str, key: str) -> asyncio.Lock:
+    """Return the in-process lock for ``key`` so concurrent duplicates wait for the first request.
+
+    Duplicates served by other processes are serialized by the primary key of
+    ``idempotency_keys`` instead.
+    """
+    lock = _locks.get((scope, key))
+    if lock is None:
+        lock = _locks[(scope, key)] = asyncio.Lock()
+    return lock
+
+
+def new_key(scope: str, key: str, request_hash: str) -> IdempotencyKey:
+    return IdempotencyKey(
+        scope=scope,
+        key=key,
+        request_hash=request_hash,
+        expires_at=datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+    )
+
+
+def store_response(record: IdempotencyKey, response_body: Any, resource_id: Optional[int] = None) -> None:
+    record.response_body = response_body
+    record.response_hash = request_hash(response_body)
+    record.resource_id = resource_id
+
+
+async def get_key(db: AsyncSession, scope: str, key: str) -> Optional[IdempotencyKey]:
+    """Return the live record for ``key``; an expired record is deleted so the key can be reused."""
+    record = await db.get(IdempotencyKey, (scope, key), populate_existing=True)
+    if record is not None and record.expires_at is not None and record.expires_at <= datetime.utcnow():
+        await db.delete(record)
+        await db.flush()
+        return None
+    return record
+
+
+def check_replay(record: IdempotencyKey, request_hash: str) -> Any:
+    """Return the stored response of ``record`` if it was created for the same request."""
+    if record.request_hash != request_hash:
+        raise IdempotencyKeyMismatchError("Idempotency key was already used with a different request.")
+    return record.response_body
+
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    await db.commit()
+    return result.rowcount
+
+
+async def purge_expired_keys_periodically(sessionmaker, interval: float) -> None:
+    while True:
+        try:
+            async with sessionmaker() as db:
+                await purge_expired_keys(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Purging expired idempotency keys failed")
+        await asyncio.sleep(interval)
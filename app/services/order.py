@@ -1,14 +1,53 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import case, exists, func, insert, tuple_, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, selectinload
 
 from app.models import OrderItem
 from app.models.order import Order
-from app.schemas.order import OrderCreate, OrderStatus
-from app.services.product import get_product
-from app.core.exceptions import InsufficientStockError, ProductNotFoundError
+from app.models.product import Product
+from app.schemas.order import (
+    OrderCreate,
+    OrderFilter,
+    OrderRead,
+    OrderSort,
+    OrderStats,
+    OrderStatus,
+    OrderStatusTransitionResult,
+    ProductDailySales,
+    order_list_adapter,
+)
+from app.core.batching import MicroBatcher
+from app.core.config import settings
+from app.core.exceptions import (
+    InsufficientStockError,
+    InvalidCursorError,
+    InvalidStatusTransitionError,
+    ProductNotFoundError,
+    StockReservationConflictError,
+)
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.dialect import begin_write
+from app.db.retry import is_retryable, run_with_retries
+from app.services import idempotency, stock
+from app.services.outbox import record_event
+from app.services.product import invalidate_products
+
+
+ORDER_SCOPE = "orders"
+
+
+class _StockChangedError(Exception):
+    """Raised inside a reservation when the guarded decrement did not match every row."""
+
+
+# lost races on stock; retrying the whole transaction re-reads it
+STOCK_RETRY_ERRORS = (_StockChangedError, stock.ShardsChangedError)
 
 
 async def get_order(db: AsyncSession, order_id: int) -> Order:
@@ -20,37 +59,521 @@ async def get_order(db: AsyncSession, order_id: int) -> Order:
     return result.scalars().first()
 
 
-async def get_orders(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Order]:
+def order_cursor(order: OrderRead) -> str:
+    return encode_cursor(order.created_at.isoformat(), order.id)
+
+
+def _decode_order_cursor(cursor: str) -> tuple:
+    created_at, order_id = decode_cursor(cursor, 2)
+    try:
+        created_at = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor.") from e
+    if not isinstance(order_id, int):
+        raise InvalidCursorError("Invalid cursor.")
+    return created_at, order_id
+
+
+def _filter_orders(query, filters: Optional[OrderFilter]):
+    if filters is None:
+        return query
+    if filters.status:
+        query = query.where(Order.status.in_(filters.status))
+    if filters.created_from is not None:
+        query = query.where(Order.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(Order.created_at < filters.created_to)
+    if filters.product_id is not None:
+        item = aliased(OrderItem)
+        query = query.where(exists().where(item.order_id == Order.id, item.product_id == filters.product_id))
+    return query
+
+
+def _orders_page(
+    columns, skip: int, limit: int, cursor: Optional[str], filters: Optional[OrderFilter], sort: OrderSort
+):
+    query = _filter_orders(select(*columns), filters)
+    key = tuple_(Order.created_at, Order.id)
+    if sort is OrderSort.created_at_desc:
+        query = query.order_by(Order.created_at.desc(), Order.id.desc())
+        if cursor is not None:
+            query = query.where(key < _decode_order_cursor(cursor))
+    else:
+        query = query.order_by(Order.created_at, Order.id)
+        if cursor is not None:
+            query = query.where(key > _decode_order_cursor(cursor))
+    return query.offset(skip).limit(limit)
+
+
+async def get_orders(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[OrderFilter] = None,
+    sort: OrderSort = OrderSort.created_at,
+) -> List[OrderRead]:
+    """Return a page of orders matching ``filters`` ordered by ``(created_at, id)``.
+
+    Every filter is backed by an index: status and date range by
+    ``ix_orders_status_created_at``/``ix_orders_created_at_id`` and ``product_id``
+    by ``ix_order_items_product_id``. Orders and their items are fetched as plain
+    rows (two queries) and validated in one ``TypeAdapter`` call instead of
+    building ORM instances.
+    """
+    columns = (Order.id, Order.created_at, Order.status, Order.version)
+    result = await db.execute(_orders_page(columns, skip, limit, cursor, filters, sort))
+    orders = {row["id"]: {**row, "items": []} for row in result.mappings()}
+    await _attach_items(db, orders)
+    return order_list_adapter.validate_python(list(orders.values()))
+
+
+async def get_order_versions(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[OrderFilter] = None,
+    sort: OrderSort = OrderSort.created_at,
+) -> List[Tuple[int, int]]:
+    """Return ``(id, version)`` of the orders ``get_orders`` would return, to revalidate a cached page.
+
+    Items never change after an order is created, so the order versions cover them.
+    """
+    result = await db.execute(_orders_page((Order.id, Order.version), skip, limit, cursor, filters, sort))
+    return [tuple(row) for row in result]
+
+
+async def get_order_stats(db: AsyncSession, filters: Optional[OrderFilter] = None) -> OrderStats:
+    """Aggregate order counts by status and units/revenue per product and day in SQL.
+
+    Cancelled orders are left out of units and revenue unless ``filters.status``
+    asks for them. Revenue uses the current product price, as order items do not
+    record the price paid.
+    """
+    status_counts = await db.execute(
+        _filter_orders(select(Order.status, func.count(Order.id)), filters).group_by(Order.status)
+    )
+
+    day = func.date(Order.created_at).label("day")
+    sales_query = (
+        select(
+            day,
+            OrderItem.product_id,
+            Product.name.label("product_name"),
+            func.sum(OrderItem.quantity).label("units"),
+            func.sum(OrderItem.quantity * Product.price).label("revenue"),
+        )
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+    )
+    sales_query = _filter_orders(sales_query, filters)
+    if filters is None or not filters.status:
+        sales_query = sales_query.where(Order.status != OrderStatus.cancelled)
+    if filters is not None and filters.product_id is not None:
+        sales_query = sales_query.where(OrderItem.product_id == filters.product_id)
+    sales = await db.execute(
+        sales_query.group_by(day, OrderItem.product_id, Product.name).order_by(day, OrderItem.product_id)
+    )
+
+    return OrderStats(
+        by_status={status: count for status, count in status_counts},
+        products=[ProductDailySales.model_validate(row, from_attributes=True) for row in sales],
+    )
+
+
+async def _attach_items(db: AsyncSession, orders: Dict[int, Dict[str, Any]]) -> None:
+    """Fill the ``items`` list of each order record with one ``IN`` query."""
+    if not orders:
+        return
+    items = await db.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.id)
+        .where(OrderItem.order_id.in_(orders))
+        .order_by(OrderItem.id)
+    )
+    for item in items:
+        orders[item.order_id]["items"].append({"product_id": item.product_id, "quantity": item.quantity, "id": item.id})
+
+
+ORDER_EXPORT_CSV_FIELDS = ["order_id", "created_at", "status", "item_id", "product_id", "quantity"]
+
+
+async def stream_orders(db: AsyncSession, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield all orders with their items in id order, ``chunk_size`` orders at a time.
+
+    Orders come from a server-side cursor; the items of each chunk are fetched with
+    one ``IN`` query instead of per-order relationship loads.
+    """
+    result = await db.stream(
+        select(Order.id, Order.created_at, Order.status, Order.version)
+        .order_by(Order.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.mappings().partitions():
+        orders = {row["id"]: {**row, "items": []} for row in partition}
+        await _attach_items(db, orders)
+        yield list(orders.values())
+
+
+async def flatten_order_chunks(
+    chunks: AsyncIterator[List[Dict[str, Any]]]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Turn order records into one CSV row per order item."""
+    async for orders in chunks:
+        rows = []
+        for order in orders:
+            base = {"order_id": order["id"], "created_at": order["created_at"], "status": order["status"]}
+            if not order["items"]:
+                rows.append(base)
+            for item in order["items"]:
+                rows.append(
+                    {**base, "item_id": item["id"], "product_id": item["product_id"], "quantity": item["quantity"]}
+                )
+        yield rows
+
+
+async def _reserve_stock(db: AsyncSession, order: OrderCreate) -> None:
+    """Check and decrement stock for every line of ``order`` in two statements.
+
+    All referenced products are fetched and locked with a single
+    ``SELECT ... FOR UPDATE`` in ascending id order, so concurrent reservations
+    touching overlapping products always lock rows in the same order and cannot
+    deadlock each other. Every line is checked against the locked quantities
+    (lines for the same product are summed) and the decrements are applied with
+    one ``UPDATE ... CASE`` statement guarded by ``quantity >= requested``.
+
+    Sharded products are not locked: their quantity is taken from one of their
+    slots afterwards (see ``stock.take``), so orders for a hot product only
+    contend for a slot.
+    """
+    requested: Dict[int, int] = Counter()
+    for item in order.items:
+        requested[item.product_id] += item.quantity
+
     result = await db.execute(
-        select(Order)
-        .options(selectinload(Order.items))
-        .offset(skip)
-        .limit(limit)
+        select(Product.id, Product.name, Product.quantity)
+        .where(Product.id.in_(requested), Product.stock_slots == 0)
+        .order_by(Product.id)
+        .with_for_update()
     )
-    return result.scalars().all()
+    stock_rows = {row.id: row for row in result}
+    sharded = {}
+    if len(stock_rows) != len(requested):
+        result = await db.execute(
+            select(Product.id, Product.name)
+            .where(Product.id.in_([product_id for product_id in requested if product_id not in stock_rows]))
+        )
+        sharded = dict(result.all())
 
+    for item in order.items:
+        if item.product_id not in stock_rows and item.product_id not in sharded:
+            raise ProductNotFoundError(f"Product with id {item.product_id} does not exist.")
+    for product_id, row in stock_rows.items():
+        if row.quantity < requested[product_id]:
+            raise InsufficientStockError(f"Insufficient quantity for product {row.name}.")
 
-async def create_order(db: AsyncSession, order: OrderCreate) -> Order:
+    if stock_rows:
+        plain = {product_id: requested[product_id] for product_id in stock_rows}
+        requested_quantity = case(plain, value=Product.id)
+        result = await db.execute(
+            update(Product)
+            .where(Product.id.in_(plain), Product.stock_slots == 0, Product.quantity >= requested_quantity)
+            .values(quantity=Product.quantity - requested_quantity, version=Product.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(plain):
+            raise _StockChangedError()
+    for product_id in sorted(sharded):
+        if not await stock.take(db, product_id, requested[product_id]):
+            raise InsufficientStockError(f"Insufficient quantity for product {sharded[product_id]}.")
+
+
+async def _create_order_once(
+    db: AsyncSession, order: OrderCreate, idempotency_key: Optional[str], request_hash: Optional[str]
+) -> Tuple[OrderRead, bool]:
     db_order = Order(status=order.status or OrderStatus.in_progress)
     async with db.begin():
+        await begin_write(db)
+        record = None
+        if idempotency_key is not None:
+            existing = await idempotency.get_key(db, ORDER_SCOPE, idempotency_key)
+            if existing is not None:
+                return OrderRead.model_validate(idempotency.check_replay(existing, request_hash)), True
+            record = idempotency.new_key(ORDER_SCOPE, idempotency_key, request_hash)
+            db.add(record)
+            await db.flush()
+        await _reserve_stock(db, order)
         for item in order.items:
-            product = await get_product(db, item.product_id)
-            if not product:
-                raise ProductNotFoundError(f"Product with id {item.product_id} does not exist.")
-            if product.quantity < item.quantity:
-                raise InsufficientStockError(f"Insufficient quantity for product {product.name}.")
-            product.quantity -= item.quantity
-
-            db_item = OrderItem(product_id=item.product_id, quantity=item.quantity)
-            db_order.items.append(db_item)
+            db_order.items.append(OrderItem(product_id=item.product_id, quantity=item.quantity))
         db.add(db_order)
-    await db.refresh(db_order)
-    return db_order
+        await db.flush()
+        result = OrderRead.model_validate(db_order)
+        payload = result.model_dump(mode="json")
+        record_event(db, "order.created", "order", db_order.id, payload)
+        if record is not None:
+            idempotency.store_response(record, payload, resource_id=db_order.id)
+    await invalidate_products({item.product_id for item in order.items})
+    return result, False
+
+
+async def _create_order_with_retries(
+    db: AsyncSession, order: OrderCreate, idempotency_key: Optional[str], request_hash: Optional[str]
+) -> Tuple[OrderRead, bool]:
+    try:
+        return await run_with_retries(
+            lambda: _create_order_once(db, order, idempotency_key, request_hash),
+            retry_on=STOCK_RETRY_ERRORS,
+        )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        # another process committed an order under the same key first; replay its result
+        return await _create_order_once(db, order, idempotency_key, request_hash)
+    except (DBAPIError, *STOCK_RETRY_ERRORS) as e:
+        if isinstance(e, DBAPIError) and not is_retryable(e):
+            raise
+        raise StockReservationConflictError(
+            "Could not reserve stock because of concurrent updates, please retry."
+        ) from e
+
+
+async def create_orders_in_transaction(
+    db: AsyncSession, orders: List[OrderCreate]
+) -> List[Union[OrderRead, InsufficientStockError, ProductNotFoundError]]:
+    """Reserve stock for and insert ``orders`` in the caller's open write transaction.
+
+    Stock is reserved order by order, each in its own SAVEPOINT, so an order
+    asking for more than is left, or for a missing product, is rolled back alone
+    and the rest are still written. The accepted orders and their items are
+    written with one multi-row ``INSERT`` each. Returns the created order or the
+    stock error of each order; product caches are left to the caller.
+    """
+    outcomes: List[Union[OrderRead, Exception, None]] = [None] * len(orders)
+    # lock every product of the batch in id order up front, as a single reservation does
+    await db.execute(
+        select(Product.id)
+        .where(
+            Product.id.in_({item.product_id for order in orders for item in order.items}),
+            Product.stock_slots == 0,
+        )
+        .order_by(Product.id)
+        .with_for_update()
+    )
+    for i, order in enumerate(orders):
+        try:
+            async with db.begin_nested():
+                await _reserve_stock(db, order)
+        except (InsufficientStockError, ProductNotFoundError) as e:
+            outcomes[i] = e
+    accepted = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if not accepted:
+        return outcomes
+    result = await db.execute(
+        insert(Order).returning(Order.id, Order.created_at, Order.status, Order.version, sort_by_parameter_order=True),
+        [{"status": orders[i].status or OrderStatus.in_progress} for i in accepted],
+    )
+    records = [{**row, "items": []} for row in result.mappings()]
+    lines = [(record, item) for i, record in zip(accepted, records) for item in orders[i].items]
+    if lines:
+        result = await db.execute(
+            insert(OrderItem).returning(OrderItem.id, sort_by_parameter_order=True),
+            [
+                {"order_id": record["id"], "product_id": item.product_id, "quantity": item.quantity}
+                for record, item in lines
+            ],
+        )
+        for (record, item), item_id in zip(lines, result.scalars()):
+            record["items"].append({"product_id": item.product_id, "quantity": item.quantity, "id": item_id})
+    for i, created in zip(accepted, order_list_adapter.validate_python(records)):
+        outcomes[i] = created
+        record_event(db, "order.created", "order", created.id, created.model_dump(mode="json"))
+    return outcomes
+
+
+def created_order_products(orders: List[OrderCreate], outcomes: List[Union[OrderRead, Exception]]) -> Set[int]:
+    return {
+        item.product_id
+        for order, outcome in zip(orders, outcomes) if isinstance(outcome, OrderRead)
+        for item in order.items
+    }
+
+
+async def _create_order_batch_once(db: AsyncSession, orders: List[OrderCreate]) -> List[Union[OrderRead, Exception]]:
+    async with db.begin():
+        await begin_write(db)
+        outcomes = await create_orders_in_transaction(db, orders)
+    await invalidate_products(created_order_products(orders, outcomes))
+    return outcomes
+
+
+async def create_order_batch(db: AsyncSession, orders: List[OrderCreate]) -> List[Union[OrderRead, Exception]]:
+    """Create ``orders`` in one transaction, returning the created order or the stock error of each.
+
+    See ``create_orders_in_transaction``; the transaction is retried as a whole
+    on lock conflicts.
+    """
+    try:
+        return await run_with_retries(
+            lambda: _create_order_batch_once(db, orders),
+            retry_on=STOCK_RETRY_ERRORS,
+        )
+    except (DBAPIError, *STOCK_RETRY_ERRORS) as e:
+        if isinstance(e, DBAPIError) and not is_retryable(e):
+            raise
+        raise StockReservationConflictError(
+            "Could not reserve stock because of concurrent updates, please retry."
+        ) from e
+
+
+order_batcher: MicroBatcher[OrderCreate, OrderRead] = MicroBatcher(
+    create_order_batch, window=settings.ORDER_BATCH_WINDOW, max_size=settings.ORDER_BATCH_MAX_SIZE
+)
+
+
+async def create_order(
+    db: AsyncSession, order: OrderCreate, idempotency_key: Optional[str] = None
+) -> Tuple[OrderRead, bool]:
+    """Create ``order``, retrying the whole transaction on lock conflicts.
+
+    Serialization failures, deadlocks and guarded decrements that lost a race are
+    retried by ``run_with_retries``; a retry re-reads stock, so a lost race ends in
+    ``InsufficientStockError`` when the stock is really gone.
+
+    With an ``idempotency_key`` the key, order id and response are stored in the
+    order's transaction. A request reusing the key gets the stored response back
+    without reserving stock again; duplicates arriving while the first request is
+    running wait for it. Returns the order and whether it was replayed.
+
+    With ``ORDER_BATCH_ENABLED``, orders without a key go through
+    ``order_batcher`` and are committed together with the orders that arrive
+    within ``ORDER_BATCH_WINDOW`` seconds (see ``create_order_batch``).
+    """
+    if idempotency_key is None:
+        if settings.ORDER_BATCH_ENABLED:
+            return await order_batcher.submit(db, order), False
+        return await _create_order_with_retries(db, order, None, None)
+    request_hash = idempotency.request_hash(order.model_dump(mode="json"))
+    async with idempotency.key_lock(ORDER_SCOPE, idempotency_key):
+        return await _create_order_with_retries(db, order, idempotency_key, request_hash)
+
+
+ALLOWED_TRANSITIONS: Dict[OrderStatus, Set[OrderStatus]] = {
+    OrderStatus.in_progress: {OrderStatus.shipped, OrderStatus.cancelled},
+    OrderStatus.shipped: {OrderStatus.delivered},
+    OrderStatus.delivered: set(),
+    OrderStatus.cancelled: set(),
+}
+
+
+async def _release_stock(db: AsyncSession, order_ids: List[int]) -> Set[int]:
+    """Return the reserved quantity of ``order_ids`` to stock with one ``UPDATE ... CASE``.
+
+    Quantities of sharded products go back into one of their slots instead.
+    """
+    result = await db.execute(
+        select(OrderItem.product_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.product_id)
+    )
+    released = dict(result.all())
+    if not released:
+        return set()
+    # lock in the same order as reservations so the two cannot deadlock
+    result = await db.execute(
+        select(Product.id)
+        .where(Product.id.in_(released), Product.stock_slots == 0)
+        .order_by(Product.id)
+        .with_for_update()
+    )
+    plain = {product_id: released[product_id] for product_id in result.scalars()}
+    if plain:
+        await db.execute(
+            update(Product)
+            .where(Product.id.in_(plain))
+            .values(quantity=Product.quantity + case(plain, value=Product.id), version=Product.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    for product_id in sorted(set(released) - set(plain)):
+        await stock.put(db, product_id, released[product_id])
+    return set(released)
+
+
+# side effects run in the same transaction as the status change; they return the product ids they touched
+ON_ENTER: Dict[OrderStatus, Callable[[AsyncSession, List[int]], Awaitable[Set[int]]]] = {
+    OrderStatus.cancelled: _release_stock,
+}
+
+
+async def _transition(
+    db: AsyncSession, order_ids: List[int], status: OrderStatus, sources: Iterable[OrderStatus]
+) -> Tuple[List[int], Set[int]]:
+    result = await db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.status.in_(list(sources)))
+        .values(status=status, version=Order.version + 1)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    moved = sorted(result.scalars())
+    for order_id in moved:
+        record_event(db, "order.status_changed", "order", order_id, {"id": order_id, "status": status.value})
+    touched_products: Set[int] = set()
+    if moved and status in ON_ENTER:
+        touched_products = await ON_ENTER[status](db, moved)
+    return moved, touched_products
+
+
+async def transition_orders(
+    db: AsyncSession, order_ids: Iterable[int], status: OrderStatus, sources: Optional[Iterable[OrderStatus]] = None
+) -> List[int]:
+    """Move every order in ``order_ids`` that may enter ``status`` with one conditional ``UPDATE``.
+
+    ``sources`` defaults to every status with a transition to ``status``; orders in
+    any other status, or that do not exist, are left alone. The ``ON_ENTER`` side
+    effect for ``status`` runs in the same transaction. Returns the ids that moved.
+    """
+    order_ids = list(order_ids)
+    if sources is None:
+        sources = [source for source, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+
+    async def attempt():
+        try:
+            if not db.in_transaction():
+                await begin_write(db)
+            moved, touched_products = await _transition(db, order_ids, status, sources)
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        return moved, touched_products
+
+    moved, touched_products = await run_with_retries(attempt, retry_on=(stock.ShardsChangedError,))
+    await invalidate_products(touched_products)
+    return moved
 
 
 async def update_order_status(db: AsyncSession, db_order: Order, status: OrderStatus) -> Order:
-    db_order.status = status
-    db.add(db_order)
-    await db.commit()
+    if status == db_order.status:
+        return db_order
+    if status not in ALLOWED_TRANSITIONS[db_order.status]:
+        raise InvalidStatusTransitionError(
+            f"Cannot change order status from {db_order.status.value} to {status.value}."
+        )
+    # guard on the status we validated against so a concurrent change cannot be overwritten
+    if not await transition_orders(db, [db_order.id], status, sources=[db_order.status]):
+        raise InvalidStatusTransitionError("Order status was changed concurrently, please retry.")
     await db.refresh(db_order)
     return db_order
+
+
+async def bulk_transition_orders(
+    db: AsyncSession, order_ids: List[int], status: OrderStatus
+) -> OrderStatusTransitionResult:
+    moved = await transition_orders(db, set(order_ids), status)
+    moved_ids = set(moved)
+    return OrderStatusTransitionResult(
+        status=status,
+        transitioned=moved,
+        rejected=sorted(set(order_ids) - moved_ids),
+    )
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import order_intake_lag
+from app.db.dialect import begin_write
+from app.db.retry import run_with_retries
+from app.models.order_intake import OrderIntake
+from app.schemas.order import OrderCreate, OrderIntakeRead, OrderIntakeStatus, OrderRead
+from app.services import order as order_service
+from app.services.outbox import OutboxNotifier
+from app.services.product import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+# wakes idle workers of this process when an order is queued
+notifier = OutboxNotifier()
+
+
+async def enqueue_order(db: AsyncSession, order: OrderCreate) -> OrderIntakeRead:
+    """Queue ``order`` for the intake workers; stock is only checked when a worker creates it."""
+    intake = OrderIntake(payload=order.model_dump(mode="json"), status=OrderIntakeStatus.queued)
+    db.add(intake)
+    await db.commit()
+    notifier.notify()
+    return OrderIntakeRead.model_validate(intake)
+
+
+async def get_order_intake(db: AsyncSession, intake_id: int) -> Optional[OrderIntake]:
+    return await db.get(OrderIntake, intake_id)
+
+
+def _processed_row(intake_id: int, outcome, processed_at: datetime) -> dict:
+    row = {"id": intake_id, "processed_at": processed_at}
+    if isinstance(outcome, OrderRead):
+        return {**row, "status": OrderIntakeStatus.completed, "order_id": outcome.id, "error": None}
+    return {**row, "status": OrderIntakeStatus.failed, "order_id": None, "error": str(outcome)}
+
+
+class OrderIntakeWorkers:
+    """Pool of ``workers`` tasks creating queued orders, ``batch_size`` at a time.
+
+    Each worker claims the oldest queued orders with ``FOR UPDATE SKIP LOCKED``,
+    so workers in any number of processes never claim the same order, and creates
+    them with ``create_orders_in_transaction``. Marking the queue rows happens in
+    the same transaction, so an order is created exactly once even if a worker
+    dies mid-batch. Orders that fail their stock check are marked ``failed``
+    with the error; lock conflicts leave the batch queued for the next attempt.
+    """
+
+    def __init__(self, sessionmaker, workers: int = None, batch_size: int = None, poll_interval: float = None):
+        self.sessionmaker = sessionmaker
+        self.workers = workers or settings.ORDER_INTAKE_WORKERS
+        self.batch_size = batch_size or settings.ORDER_INTAKE_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.ORDER_INTAKE_POLL_INTERVAL
+        self.completed = 0
+        self.failed = 0
+        self.errors = 0
+        self.queue_depth = 0
+        self.oldest_queued_seconds = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    async def _process_batch(self, db: AsyncSession) -> int:
+        async with db.begin():
+            await begin_write(db)
+            result = await db.execute(
+                select(OrderIntake.id, OrderIntake.created_at, OrderIntake.payload)
+                .where(OrderIntake.status == OrderIntakeStatus.queued)
+                .order_by(OrderIntake.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = result.all()
+            if not claimed:
+                return 0
+            outcomes = {}
+            orders = {}
+            for row in claimed:
+                try:
+                    orders[row.id] = OrderCreate.model_validate(row.payload)
+                except ValidationError as e:
+                    outcomes[row.id] = e
+            outcomes.update(
+                zip(orders, await order_service.create_orders_in_transaction(db, list(orders.values())))
+            )
+            now = datetime.utcnow()
+            # one executemany UPDATE by primary key for the whole batch
+            await db.execute(update(OrderIntake), [_processed_row(row.id, outcomes[row.id], now) for row in claimed])
+        await invalidate_products(order_service.created_order_products(
+            list(orders.values()), [outcomes[intake_id] for intake_id in orders]
+        ))
+        for row in claimed:
+            status = "completed" if isinstance(outcomes[row.id], OrderRead) else "failed"
+            order_intake_lag.observe((now - row.created_at).total_seconds(), status)
+        created = sum(isinstance(outcome, OrderRead) for outcome in outcomes.values())
+        self.completed += created
+        self.failed += len(claimed) - created
+        return len(claimed)
+
+    async def process_once(self) -> int:
+        """Create one batch of queued orders; returns how many were claimed."""
+
+        async def attempt():
+            async with self.sessionmaker() as db:
+                return await self._process_batch(db)
+
+        return await run_with_retries(attempt, retry_on=order_service.STOCK_RETRY_ERRORS)
+
+    async def refresh_stats(self) -> None:
+        async with self.sessionmaker() as db:
+            result = await db.execute(
+                select(func.count(OrderIntake.id), func.min(OrderIntake.created_at))
+                .where(OrderIntake.status == OrderIntakeStatus.queued)
+            )
+            depth, oldest = result.one()
+        self.queue_depth = depth
+        self.oldest_queued_seconds = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                if await self.process_once() >= self.batch_size:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Order intake batch failed")
+            await notifier.wait(self.poll_interval)
+
+    async def _monitor(self) -> None:
+        while True:
+            try:
+                await self.refresh_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Order intake stats query failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from sqlalchemy import delete, event, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.dialect import begin_write
+from app.models.outbox_event import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(
+    db: AsyncSession, event_type: str, aggregate_type: str, aggregate_id: int, payload: Dict[str, Any]
+) -> OutboxEvent:
+    """Add a change event to the session so it commits atomically with the change itself."""
+    outbox_event = OutboxEvent(
+        event_type=event_type, aggregate_type=aggregate_type, aggregate_id=aggregate_id, payload=payload
+    )
+    db.add(outbox_event)
+    return outbox_event
+
+
+def event_to_dict(outbox_event: OutboxEvent) -> Dict[str, Any]:
+    return {
+        "id": outbox_event.id,
+        "created_at": outbox_event.created_at.isoformat(),
+        "event_type": outbox_event.event_type,
+        "aggregate_type": outbox_event.aggregate_type,
+        "aggregate_id": outbox_event.aggregate_id,
+        "payload": outbox_event.payload,
+    }
+
+
+class OutboxNotifier:
+    """Wakes in-process waiters when a transaction that wrote events commits.
+
+    Other processes are not notified; their waiters fall back to polling.
+    """
+
+    def __init__(self):
+        self._waiters: Set[asyncio.Future] = set()
+
+    def notify(self) -> None:
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, timeout: float) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+
+notifier = OutboxNotifier()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_outbox_written(session, flush_context):
+    if any(isinstance(obj, OutboxEvent) for obj in session.new):
+        session.info["outbox_written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_outbox_committed(session):
+    if session.info.pop("outbox_written", False):
+        notifier.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_outbox_mark(session):
+    session.info.pop("outbox_written", None)
+
+
+async def get_events(db: AsyncSession, after: int = 0, limit: int = 100) -> List[OutboxEvent]:
+    """Return events with ``id > after``, oldest first.
+
+    Event ids are assigned before commit, so a transaction that commits late can
+    publish an id lower than one already served. Events younger than
+    ``EVENTS_VISIBILITY_DELAY`` are held back to give such transactions time to
+    commit before readers move past their ids.
+    """
+    visible_before = datetime.utcnow() - timedelta(seconds=settings.EVENTS_VISIBILITY_DELAY)
+    result = await db.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.id > after, OutboxEvent.created_at <= visible_before)
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def wait_for_events(db: AsyncSession, after: int, limit: int, timeout: float) -> List[OutboxEvent]:
+    """Long-poll for events after ``after`` for up to ``timeout`` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        events = await get_events(db, after=after, limit=limit)
+        remaining = deadline - loop.time()
+        if events or remaining <= 0:
+            return events
+        # end the read transaction so the next poll sees newly committed rows
+        await db.rollback()
+        await notifier.wait(min(remaining, settings.OUTBOX_POLL_INTERVAL))
+        if settings.EVENTS_VISIBILITY_DELAY:
+            await asyncio.sleep(min(settings.EVENTS_VISIBILITY_DELAY, max(deadline - loop.time(), 0)))
+
+
+class EventSink(ABC):
+    """Destination for dispatched outbox events; ``send`` must raise if delivery failed."""
+
+    @abstractmethod
+    async def send(self, events: List[Dict[str, Any]]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySink(EventSink):
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    async def send(self, events: List[Dict[str, Any]]) -> None:
+        self.events.extend(events)
+
+
+class FileSink(EventSink):
+    """Appends events as NDJSON to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send(self, events: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class WebhookSink(EventSink):
+    """POSTs each batch as a JSON array; any non-2xx response fails the batch."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, events: List[Dict[str, Any]]) -> None:
+        response = await self._client.post(self.url, json=events)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def sink_from_settings() -> Optional[EventSink]:
+    if settings.OUTBOX_SINK == "file":
+        return FileSink(settings.OUTBOX_FILE_PATH)
+    if settings.OUTBOX_SINK == "webhook":
+        return WebhookSink(settings.OUTBOX_WEBHOOK_URL)
+    return None
+
+
+class OutboxDispatcher:
+    """Background task that drains pending outbox events to a sink in batches.
+
+    Each batch is claimed with ``FOR UPDATE SKIP LOCKED`` so several workers can
+    dispatch in parallel, and is only marked dispatched after the sink accepted
+    it, which gives at-least-once delivery. Without a sink it only prunes events
+    older than ``OUTBOX_RETENTION_SECONDS``.
+    """
+
+    def __init__(self, sessionmaker, sink: Optional[EventSink], batch_size: int = None,
+                 poll_interval: float = None, retention_seconds: float = None):
+        self.sessionmaker = sessionmaker
+        self.sink = sink
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self.retention_seconds = retention_seconds or settings.OUTBOX_RETENTION_SECONDS
+        self.dispatched = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def dispatch_once(self) -> int:
+        if self.sink is None:
+            return 0
+        async with self.sessionmaker() as db:
+            async with db.begin():
+                await begin_write(db)
+                result = await db.execute(
+                    select(OutboxEvent)
+                    .where(OutboxEvent.dispatched_at.is_(None))
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                events = result.scalars().all()
+                if not events:
+                    return 0
+                await self.sink.send([event_to_dict(e) for e in events])
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_([e.id for e in events]))
+                    .values(dispatched_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+        self.dispatched += len(events)
+        return len(events)
+
+    async def prune(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        query = delete(OutboxEvent).where(OutboxEvent.created_at < cutoff)
+        if self.sink is not None:
+            query = query.where(OutboxEvent.dispatched_at.is_not(None))
+        async with self.sessionmaker() as db:
+            result = await db.execute(query)
+            await db.commit()
+        return result.rowcount
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_prune = loop.time()
+        while True:
+            try:
+                if loop.time() >= next_prune:
+                    await self.prune()
+                    next_prune = loop.time() + 3600
+                if await self.dispatch_once() >= self.batch_size:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures += 1
+                logger.exception("Outbox dispatch failed")
+            await notifier.wait(self.poll_interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.sink is not None:
+            await self.sink.close()
+
+
+async def event_stream(db: AsyncSession, after: int, limit: int, keepalive: float) -> AsyncIterator[str]:
+    """Yield events after ``after`` as Server-Sent Events, forever.
+
+    A comment line is sent whenever ``keepalive`` seconds pass without events so
+    proxies keep the connection open and disconnected clients are noticed.
+    """
+    while True:
+        events = [event_to_dict(e) for e in await wait_for_events(db, after=after, limit=limit, timeout=keepalive)]
+        # do not hold a transaction open while the client consumes the stream
+        await db.rollback()
+        if not events:
+            yield ": keepalive\n\n"
+            continue
+        for data in events:
+            yield f"id: {data['id']}\nevent: {data['event_type']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        after = events[-1]["id"]
@@ -1,10 +1,56 @@
+from collections import Counter
+from sqlalchemy import and_, bindparam, case, func, literal, or_, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
-from app.core.exceptions import ProductNotFoundError
+from app.core.cache import LRUCache, RedisBackend, TieredCache
+from app.core.config import settings
+from app.core.exceptions import (
+    InsufficientStockError,
+    InvalidCursorError,
+    ProductNotFoundError,
+    VersionConflictError,
+)
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.dialect import begin_write, dialect_name, upsert_insert
+from app.db.retry import run_with_retries
 from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.schemas.product import (
+    BulkUpsertStatus,
+    ProductBulkResult,
+    ProductCreate,
+    ProductRead,
+    ProductSearchHit,
+    ProductUpdate,
+    product_list_adapter,
+    product_search_adapter,
+    StockAdjustmentBatch,
+    StockAdjustmentResult,
+    StockLevel,
+    StockShardsRead,
+)
+from app.services import idempotency, stock
+from app.services.outbox import record_event
+
+STOCK_ADJUSTMENT_SCOPE = "stock-adjustments"
+
+product_cache = TieredCache(
+    local=LRUCache(max_size=settings.PRODUCT_CACHE_MAX_SIZE),
+    shared=RedisBackend(settings.PRODUCT_CACHE_REDIS_URL) if settings.PRODUCT_CACHE_REDIS_URL else None,
+    ttl=settings.PRODUCT_CACHE_TTL_SECONDS,
+    enabled=settings.PRODUCT_CACHE_ENABLED,
+)
+
+
+def _cache_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+async def invalidate_products(product_ids: Iterable[int]) -> None:
+    await product_cache.delete(*(_cache_key(product_id) for product_id in product_ids))
 
 async def get_product(db: AsyncSession, product_id: int) -> Product:
     result = await db.execute(select(Product).where(Product.id == product_id))
@@ -14,14 +60,200 @@ async def get_product(db: AsyncSession, product_id: int) -> Product:
     return product
 
 
+def _read_columns():
+    """The columns of ``ProductRead`` plus ``stock_slots``, for ``_apply_shard_totals``."""
+    return (
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.quantity,
+        Product.version,
+        Product.stock_slots,
+    )
+
+
+async def _apply_shard_totals(db: AsyncSession, rows: Sequence[Any]) -> Sequence[Any]:
+    """Replace the row quantity and version of sharded products with the totals of their slots.
+
+    Rows of products that are not sharded are returned as they are, so pages
+    without sharded products cost no extra query; otherwise their slots are
+    summed in one grouped query.
+    """
+    sharded = [row.id for row in rows if row.stock_slots]
+    if not sharded:
+        return rows
+    totals = await stock.shard_totals(db, sharded)
+    records = []
+    for row in rows:
+        if row.stock_slots:
+            quantity, version = totals.get(row.id, (0, 0))
+            row = SimpleNamespace(**{**row._mapping, "quantity": quantity, "version": row.version + version})
+        records.append(row)
+    return records
+
+
+async def read_product(db: AsyncSession, product_id: int) -> ProductRead:
+    result = await db.execute(select(*_read_columns()).where(Product.id == product_id))
+    rows = result.all()
+    if not rows:
+        raise ProductNotFoundError(f"Product with id {product_id} does not exist.")
+    (row,) = await _apply_shard_totals(db, rows)
+    return ProductRead.model_validate(row, from_attributes=True)
+
+
+async def get_product_data(db: AsyncSession, product_id: int, use_cache: bool = True) -> Dict[str, Any]:
+    """Return ``product_id`` as a ``ProductRead`` dict through the read-through product cache.
+
+    Cached entries can be up to ``PRODUCT_CACHE_TTL_SECONDS`` stale when another
+    process changed the product, so stock-sensitive callers pass ``use_cache=False``;
+    that still refreshes the cached entry.
+    """
+    key = _cache_key(product_id)
+    if use_cache:
+        cached = await product_cache.get(key)
+        if cached is not None:
+            return cached
+    data = (await read_product(db, product_id)).model_dump()
+    await product_cache.set(key, data)
+    return data
+
+
 async def get_product_by_name(db: AsyncSession, name: str) -> Optional[Product]:
     result = await db.execute(select(Product).where(Product.name == name))
     return result.scalars().first()
 
 
-async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Product]:
-    result = await db.execute(select(Product).offset(skip).limit(limit))
-    return result.scalars().all()
+PRODUCT_EXPORT_FIELDS = ["id", "name", "description", "price", "quantity"]
+
+
+async def stream_products(db: AsyncSession, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield all products in id order, ``chunk_size`` rows at a time, from a server-side cursor."""
+    result = await db.stream(
+        select(*_read_columns())
+        .order_by(Product.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        partition = await _apply_shard_totals(db, partition)
+        yield [{field: getattr(row, field) for field in PRODUCT_EXPORT_FIELDS} for row in partition]
+
+
+def product_cursor(product: ProductRead) -> str:
+    return encode_cursor(product.id)
+
+
+def _products_page(columns, skip: int, limit: int, cursor: Optional[str]):
+    query = select(*columns).order_by(Product.id)
+    if cursor is not None:
+        (after_id,) = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise InvalidCursorError("Invalid cursor.")
+        query = query.where(Product.id > after_id)
+    return query.offset(skip).limit(limit)
+
+
+async def get_products(
+    db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+) -> List[ProductRead]:
+    """Return a page of products in id order.
+
+    Columns are fetched as plain rows and validated in one ``TypeAdapter`` call,
+    skipping ORM instance construction, as the page is only serialized.
+    """
+    result = await db.execute(_products_page(_read_columns(), skip, limit, cursor))
+    rows = await _apply_shard_totals(db, result.all())
+    return product_list_adapter.validate_python(rows, from_attributes=True)
+
+
+async def get_product_versions(
+    db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+) -> List[Tuple[int, int]]:
+    """Return ``(id, version)`` of the products ``get_products`` would return, to revalidate a cached page."""
+    result = await db.execute(_products_page((Product.id, Product.version, Product.stock_slots), skip, limit, cursor))
+    rows = await _apply_shard_totals(db, result.all())
+    return [(row.id, row.version) for row in rows]
+
+SEARCH_MIN_LENGTH = 3
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_cursor(hit: ProductSearchHit) -> str:
+    return encode_cursor(hit.score, hit.id)
+
+
+async def _search_tier(
+    db: AsyncSession, value: int, predicate, limit: int, after: Optional[Tuple[float, int]]
+) -> List[Any]:
+    query = select(*_read_columns(), literal(value).label("score")).where(predicate)
+    if after is not None and value == after[0]:
+        query = query.where(Product.id > after[1])
+    result = await db.execute(query.order_by(Product.id).limit(limit))
+    return result.all()
+
+
+def _search_pattern(value: str):
+    # rendered into the SQL, so the planner sees the pattern: a generic plan for a bound pattern cannot use
+    # the lower(name) index range or column statistics, and would scan the table when nothing matches
+    return bindparam(None, value, literal_execute=True)
+
+
+async def search_products(
+    db: AsyncSession, q: str, limit: int = 20, cursor: Optional[str] = None
+) -> List[ProductSearchHit]:
+    """Return products whose name or description contains ``q``, best matches first.
+
+    Matches are ranked by tier, the ``score``: exact name, name prefix, name
+    substring, then description substring. Within a tier they are ordered by
+    id, and ``(score, id)`` is the keyset cursor. Tiers are read one query
+    each, best first, in id order and only until the page is full, so a short
+    query matching much of the catalog never sorts all its matches. Exact and
+    prefix matches use the btree index on ``lower(name)``. On PostgreSQL the
+    ``pg_trgm`` GIN indexes serve the substring ``ILIKE`` filters, and
+    names with a word within the trigram word similarity threshold of ``q``
+    match as a last tier (typos). SQLite has no trigram index: it scans the
+    table with ``LIKE`` and matches substrings only.
+    """
+    after = None
+    if cursor is not None:
+        after_score, after_id = decode_cursor(cursor, 2)
+        if not isinstance(after_score, (int, float)) or not isinstance(after_id, int):
+            raise InvalidCursorError("Invalid cursor.")
+        after = (after_score, after_id)
+    contains = _search_pattern(f"%{_like_escape(q)}%")
+    # exact and prefix matches on lower(name) are served by the btree ix_products_name_lower
+    exact = func.lower(Product.name) == q.lower()
+    name_prefix = func.lower(Product.name).like(_search_pattern(f"{_like_escape(q.lower())}%"), escape="\\")
+    name_contains = Product.name.ilike(contains, escape="\\")
+    description_contains = Product.description.ilike(contains, escape="\\")
+    # each tier excludes the better ones with plain predicates the planner can estimate
+    tiers = [
+        (4, exact),
+        (3, and_(name_prefix, ~exact)),
+        (2, and_(name_contains, ~name_prefix)),
+        (1, and_(description_contains, ~name_contains)),
+    ]
+    if dialect_name(db) == "postgresql":
+        # word similarity scores q against the best matching part of the name, not the whole name
+        fuzzy = _search_pattern(q).op("<%")(Product.name)
+        tiers.append((0, and_(fuzzy, ~name_contains, or_(Product.description.is_(None), ~description_contains))))
+    rows: List[Any] = []
+    # best tier first, and only until the page is full: a lower tier's exclusions then only discard the few
+    # better rows, instead of scanning past every match of a common query
+    for value, predicate in tiers:
+        if len(rows) >= limit:
+            break
+        if after is None or value <= after[0]:
+            rows += await _search_tier(db, value, predicate, limit - len(rows), after)
+    rows = await _apply_shard_totals(db, rows)
+    return product_search_adapter.validate_python(rows, from_attributes=True)
+
+def _record_product_event(db: AsyncSession, event_type: str, product: Union[Product, ProductRead]) -> None:
+    payload = ProductRead.model_validate(product).model_dump(mode="json")
+    record_event(db, event_type, "product", product.id, payload)
 
 async def create_product(db: AsyncSession, product: ProductCreate) -> Product:
     db_product = Product(
@@ -31,18 +263,256 @@ async def create_product(db: AsyncSession, product: ProductCreate) -> Product:
         quantity=product.quantity
     )
     db.add(db_product)
+    await db.flush()
+    _record_product_event(db, "product.created", db_product)
     await db.commit()
     await db.refresh(db_product)
     return db_product
 
-async def update_product(db: AsyncSession, db_product: Product, updates: ProductUpdate) -> Product:
-    for key, value in updates.model_dump(exclude_unset=True).items():
-        setattr(db_product, key, value)
-    db.add(db_product)
+async def update_product(
+    db: AsyncSession, product_id: int, updates: ProductUpdate, expected_version: Optional[int] = None
+) -> ProductRead:
+    """Apply ``updates`` and bump the product's version.
+
+    With ``expected_version`` the ``UPDATE`` only matches while the product is
+    still at that version, so a change committed since the client read it raises
+    ``VersionConflictError`` instead of being overwritten. A new ``quantity`` for
+    a sharded product replaces the stock of its slots.
+    """
+    values = updates.model_dump(exclude_unset=True)
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**values, version=Product.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(stock.effective_version() == expected_version)
+    result = await db.execute(stmt)
+    if result.rowcount == 0:
+        await db.rollback()
+        if expected_version is None:
+            raise ProductNotFoundError(f"Product with id {product_id} does not exist.")
+        raise VersionConflictError(f"Product {product_id} was modified since version {expected_version}.")
+    if "quantity" in values:
+        await stock.absorb(db, [product_id])
+    product = await read_product(db, product_id)
+    _record_product_event(db, "product.updated", product)
     await db.commit()
-    await db.refresh(db_product)
-    return db_product
+    await invalidate_products([product_id])
+    return product
 
 async def delete_product(db: AsyncSession, db_product: Product) -> None:
+    record_event(db, "product.deleted", "product", db_product.id, {"id": db_product.id})
     await db.delete(db_product)
     await db.commit()
+    await invalidate_products([db_product.id])
+
+
+async def _upsert_chunk(db: AsyncSession, chunk: List[Tuple[int, ProductCreate]]) -> List[ProductBulkResult]:
+    names = [product.name for _, product in chunk]
+    try:
+        if not db.in_transaction():
+            await begin_write(db)
+        existing = set((await db.execute(select(Product.name).where(Product.name.in_(names)))).scalars())
+        insert_stmt = upsert_insert(db, Product).values([product.model_dump() for _, product in chunk])
+        stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[Product.name],
+            set_={
+                "description": insert_stmt.excluded.description,
+                "price": insert_stmt.excluded.price,
+                "quantity": insert_stmt.excluded.quantity,
+                "version": Product.version + 1,
+            },
+        ).returning(Product.id, Product.name, Product.stock_slots)
+        rows = (await db.execute(stmt)).all()
+        ids = {row.name: row.id for row in rows}
+        sharded = [row.id for row in rows if row.stock_slots]
+        if sharded:
+            await stock.absorb(db, sharded)
+        for _, product in chunk:
+            event_type = "product.updated" if product.name in existing else "product.created"
+            payload = {"id": ids[product.name], **product.model_dump(mode="json")}
+            record_event(db, event_type, "product", ids[product.name], payload)
+        await db.commit()
+        await invalidate_products(ids.values())
+    except DBAPIError as e:
+        await db.rollback()
+        return [
+            ProductBulkResult(index=index, status=BulkUpsertStatus.error, name=product.name, error=str(e.orig))
+            for index, product in chunk
+        ]
+    return [
+        ProductBulkResult(
+            index=index,
+            status=BulkUpsertStatus.updated if product.name in existing else BulkUpsertStatus.created,
+            id=ids[product.name],
+            name=product.name,
+        )
+        for index, product in chunk
+    ]
+
+
+async def bulk_upsert_products(
+    db: AsyncSession, products: List[Tuple[int, ProductCreate]], chunk_size: int = 1000
+) -> List[ProductBulkResult]:
+    """Insert or update ``products`` by name with one ``INSERT ... ON CONFLICT`` per chunk.
+
+    ``products`` pairs each product with its position in the request. When a name
+    occurs more than once the last occurrence wins and earlier ones are reported as
+    errors. Chunks are committed separately, so a chunk rejected by the database
+    only fails its own rows.
+    """
+    last_index = {product.name: index for index, product in products}
+    results = []
+    unique = []
+    for index, product in products:
+        if last_index[product.name] == index:
+            unique.append((index, product))
+        else:
+            results.append(
+                ProductBulkResult(
+                    index=index,
+                    status=BulkUpsertStatus.error,
+                    name=product.name,
+                    error="Superseded by a later row with the same name.",
+                )
+            )
+    for start in range(0, len(unique), chunk_size):
+        results.extend(await _upsert_chunk(db, unique[start:start + chunk_size]))
+    return sorted(results, key=lambda result: result.index)
+
+
+async def _apply_failed_deltas(db: AsyncSession, deltas: Dict[int, int]) -> Dict[int, int]:
+    """Handle the products the guarded ``UPDATE`` did not match.
+
+    Sharded products get their delta applied to their slots, with their new
+    quantities returned. Any other miss is an unknown id or a quantity that
+    would go negative, and raises.
+    """
+    result = await db.execute(
+        select(Product.id, Product.name, Product.stock_slots).where(Product.id.in_(list(deltas)))
+    )
+    products = {row.id: row for row in result}
+    for product_id in deltas:
+        if product_id not in products:
+            raise ProductNotFoundError(f"Product with id {product_id} does not exist.")
+    for product_id in deltas:
+        if not products[product_id].stock_slots:
+            raise InsufficientStockError(f"Insufficient quantity for product {products[product_id].name}.")
+    for product_id, delta in deltas.items():
+        if delta > 0:
+            await stock.put(db, product_id, delta)
+        elif delta < 0 and not await stock.take(db, product_id, -delta):
+            raise InsufficientStockError(f"Insufficient quantity for product {products[product_id].name}.")
+    return await stock.sharded_quantities(db, deltas)
+
+
+async def _apply_stock_deltas(db: AsyncSession, deltas: Dict[int, int], chunk_size: int) -> Dict[int, int]:
+    """Add ``deltas`` to product quantities with one guarded ``UPDATE`` per chunk.
+
+    Returns the new quantity of every product. A chunk that does not match every
+    product (unknown id or a quantity that would go negative) raises, and the
+    caller's transaction rolls back the chunks already applied. Sharded products
+    are left out of the ``UPDATE`` and adjusted slot by slot.
+    """
+    quantities = {}
+    product_ids = sorted(deltas)
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = {product_id: deltas[product_id] for product_id in product_ids[start:start + chunk_size]}
+        delta = case(chunk, value=Product.id)
+        result = await db.execute(
+            update(Product)
+            .where(Product.id.in_(chunk), Product.stock_slots == 0, Product.quantity + delta >= 0)
+            .values(quantity=Product.quantity + delta, version=Product.version + 1)
+            .returning(Product.id, Product.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        updated = dict(result.all())
+        if len(updated) != len(chunk):
+            failed = {product_id: delta for product_id, delta in chunk.items() if product_id not in updated}
+            updated.update(await _apply_failed_deltas(db, failed))
+        quantities.update(updated)
+    return quantities
+
+
+async def _adjust_stock_once(
+    db: AsyncSession, deltas: Dict[int, int], idempotency_key: Optional[str], request_hash: str
+) -> StockAdjustmentResult:
+    async with db.begin():
+        await begin_write(db)
+        record = None
+        if idempotency_key is not None:
+            existing = await idempotency.get_key(db, STOCK_ADJUSTMENT_SCOPE, idempotency_key)
+            if existing is not None:
+                products = idempotency.check_replay(existing, request_hash)
+                return StockAdjustmentResult(replayed=True, products=products)
+            record = idempotency.new_key(STOCK_ADJUSTMENT_SCOPE, idempotency_key, request_hash)
+            db.add(record)
+            await db.flush()
+        quantities = await _apply_stock_deltas(db, deltas, settings.STOCK_ADJUSTMENT_CHUNK_SIZE)
+        result = StockAdjustmentResult(
+            products=[
+                StockLevel(product_id=product_id, quantity=quantity)
+                for product_id, quantity in sorted(quantities.items())
+            ]
+        )
+        for level in result.products:
+            payload = {"product_id": level.product_id, "delta": deltas[level.product_id], "quantity": level.quantity}
+            record_event(db, "product.stock_adjusted", "product", level.product_id, payload)
+        if record is not None:
+            idempotency.store_response(record, [level.model_dump() for level in result.products])
+    return result
+
+
+async def adjust_stock(
+    db: AsyncSession, batch: StockAdjustmentBatch, idempotency_key: Optional[str] = None
+) -> StockAdjustmentResult:
+    """Apply every delta in ``batch`` atomically, or none of them.
+
+    With an ``idempotency_key`` the key is stored in the same transaction as the
+    adjustments, and a request that reuses it gets the stored result back instead
+    of applying the deltas again.
+    """
+    deltas: Dict[int, int] = Counter()
+    for adjustment in batch.adjustments:
+        deltas[adjustment.product_id] += adjustment.delta
+    request_hash = idempotency.request_hash(batch.model_dump(mode="json"))
+
+    async def attempt() -> StockAdjustmentResult:
+        return await _adjust_stock_once(db, deltas, idempotency_key, request_hash)
+
+    retry_on = (stock.ShardsChangedError,)
+    if idempotency_key is None:
+        result = await run_with_retries(attempt, retry_on=retry_on)
+    else:
+        async with idempotency.key_lock(STOCK_ADJUSTMENT_SCOPE, idempotency_key):
+            try:
+                result = await run_with_retries(attempt, retry_on=retry_on)
+            except IntegrityError:
+                # a concurrent request with the same key committed first; replay its result
+                return await attempt()
+    await invalidate_products(deltas)
+    return result
+
+
+async def set_stock_slots(db: AsyncSession, product_id: int, slots: int) -> StockShardsRead:
+    """Split the stock of ``product_id`` evenly over ``slots`` counter slots, or keep it in the product row with 0.
+
+    Meant for hot products, e.g. during promotions: reservations then lock a
+    single slot instead of the product row, so concurrent orders for the product
+    no longer commit one at a time. Reads report the sum of the slots. Calling it
+    again rebalances the slots.
+    """
+    async def attempt() -> List[int]:
+        async with db.begin():
+            await begin_write(db)
+            result = await db.execute(select(Product.quantity).where(Product.id == product_id).with_for_update())
+            row_quantity = result.scalar()
+            if row_quantity is None:
+                raise ProductNotFoundError(f"Product with id {product_id} does not exist.")
+            return await stock.reshard(db, product_id, row_quantity, slots)
+
+    quantities = await run_with_retries(attempt)
+    await invalidate_products([product_id])
+    return StockShardsRead(product_id=product_id, slots=slots, quantities=quantities)
@@ -0,0 +1,182 @@
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.models.stock_shard import StockShard
+
+
+class ShardsChangedError(Exception):
+    """Raised when a product's slots disappeared mid-transaction because it was resharded; retry the transaction."""
+
+
+def _shard_sum(column):
+    return (
+        select(func.coalesce(func.sum(column), 0))
+        .where(StockShard.product_id == Product.id)
+        .scalar_subquery()
+    )
+
+
+def effective_version():
+    """SQL expression for a product's version, including every change made to its slots.
+
+    Only meant for single-row guards; reads fetch the slot totals separately (see ``shard_totals``).
+    """
+    return case((Product.stock_slots == 0, Product.version), else_=Product.version + _shard_sum(StockShard.version))
+
+
+def spread(total: int, slots: int) -> List[int]:
+    base, extra = divmod(total, slots)
+    return [base + (1 if slot < extra else 0) for slot in range(slots)]
+
+
+async def _lock_shards(db: AsyncSession, product_id: int):
+    result = await db.execute(
+        select(StockShard.slot, StockShard.quantity, StockShard.version)
+        .where(StockShard.product_id == product_id)
+        .order_by(StockShard.slot)
+        .with_for_update()
+    )
+    return result.all()
+
+
+async def reshard(db: AsyncSession, product_id: int, row_quantity: int, slots: int) -> List[int]:
+    """Split the stock of a locked product evenly over ``slots`` new slots, or back into its row with ``slots=0``.
+
+    Returns the new slot quantities. The product's version grows by the versions
+    of the dropped slots plus one, so its effective version never goes back.
+    """
+    shards = await _lock_shards(db, product_id)
+    total = row_quantity + sum(shard.quantity for shard in shards)
+    dropped_versions = sum(shard.version for shard in shards)
+    quantities = spread(total, slots) if slots else []
+    await db.execute(delete(StockShard).where(StockShard.product_id == product_id))
+    if quantities:
+        await db.execute(
+            insert(StockShard),
+            [{"product_id": product_id, "slot": slot, "quantity": q} for slot, q in enumerate(quantities)],
+        )
+    await db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(quantity=0 if slots else total, stock_slots=slots, version=Product.version + dropped_versions + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return quantities
+
+
+async def absorb(db: AsyncSession, product_ids: Iterable[int]) -> None:
+    """Move quantities just written to the rows of sharded ``product_ids`` into their slots.
+
+    Writes that set an absolute quantity (``PUT``, bulk upsert) store it in
+    ``products.quantity``. For sharded products it then replaces what the slots
+    held and is spread over them again.
+    """
+    result = await db.execute(
+        select(Product.id, Product.quantity, Product.stock_slots)
+        .where(Product.id.in_(list(product_ids)), Product.stock_slots > 0)
+        .order_by(Product.id)
+    )
+    for product in result.all():
+        shards = await _lock_shards(db, product.id)
+        if not shards:
+            raise ShardsChangedError()
+        quantities = dict(zip((shard.slot for shard in shards), spread(product.quantity, len(shards))))
+        await db.execute(
+            update(StockShard)
+            .where(StockShard.product_id == product.id)
+            .values(quantity=case(quantities, value=StockShard.slot), version=StockShard.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            update(Product).where(Product.id == product.id).values(quantity=0).execution_options(synchronize_session=False)
+        )
+
+
+def _free_slot(product_id: int, quantity: int = 0):
+    # SKIP LOCKED: concurrent reservations pick different slots instead of queueing; ignored on SQLite
+    return (
+        select(StockShard.slot)
+        .where(StockShard.product_id == product_id, StockShard.quantity >= quantity)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+
+async def take(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    """Take ``quantity`` from the slots of a sharded product; ``False`` if it does not have that much.
+
+    The fast path takes it from one random slot that holds enough and is not
+    locked by another reservation, in one ``UPDATE``. Otherwise every slot is
+    locked in slot order and the quantity is taken from as many slots as needed.
+    """
+    result = await db.execute(
+        update(StockShard)
+        .where(
+            StockShard.product_id == product_id,
+            StockShard.slot == _free_slot(product_id, quantity),
+            StockShard.quantity >= quantity,
+        )
+        .values(quantity=StockShard.quantity - quantity, version=StockShard.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        return True
+
+    shards = await _lock_shards(db, product_id)
+    if not shards:
+        raise ShardsChangedError()
+    if sum(shard.quantity for shard in shards) < quantity:
+        return False
+    taken: Dict[int, int] = {}
+    remaining = quantity
+    for shard in sorted(shards, key=lambda shard: -shard.quantity):
+        taken[shard.slot] = min(shard.quantity, remaining)
+        remaining -= taken[shard.slot]
+        if not remaining:
+            break
+    await db.execute(
+        update(StockShard)
+        .where(StockShard.product_id == product_id, StockShard.slot.in_(taken))
+        .values(quantity=StockShard.quantity - case(taken, value=StockShard.slot), version=StockShard.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+async def put(db: AsyncSession, product_id: int, quantity: int) -> None:
+    """Add ``quantity`` to a random unlocked slot of a sharded product, or wait for its first slot if all are busy."""
+    first_slot = select(func.min(StockShard.slot)).where(StockShard.product_id == product_id).scalar_subquery()
+    for slot in (_free_slot(product_id), first_slot):
+        result = await db.execute(
+            update(StockShard)
+            .where(StockShard.product_id == product_id, StockShard.slot == slot)
+            .values(quantity=StockShard.quantity + quantity, version=StockShard.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return
+    raise ShardsChangedError()
+
+
+async def shard_totals(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """Summed slot quantity and slot version of each sharded product in ``product_ids``, in one grouped query."""
+    result = await db.execute(
+        select(StockShard.product_id, func.sum(StockShard.quantity), func.sum(StockShard.version))
+        .where(StockShard.product_id.in_(list(product_ids)))
+        .group_by(StockShard.product_id)
+    )
+    return {product_id: (quantity, version) for product_id, quantity, version in result}
+
+
+async def sharded_quantities(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, int]:
+    result = await db.execute(
+        select(StockShard.product_id, func.sum(StockShard.quantity))
+        .where(StockShard.product_id.in_(list(product_ids)))
+        .group_by(StockShard.product_id)
+    )
+    return dict(result.all())
@@ -0,0 +1,51 @@
+"""Time ``bulk_upsert_products`` for a large catalog sync.
+
+Runs the same ``--rows`` batch twice against ``--database-url`` (defaults to
+``DATABASE_URL``): the first pass inserts every product, the second updates them::
+
+    python -m benchmarks.bulk_upsert --rows 50000 --chunk-size 1000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import get_engine, get_sessionmaker
+from app.models.product import Product
+from app.schemas.product import ProductCreate
+from app.services import product as product_service
+
+NAME_PREFIX = "bench-bulk-"
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = get_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = get_sessionmaker(engine)
+    async with sessionmaker() as db:
+        await db.execute(delete(Product).where(Product.name.like(f"{NAME_PREFIX}%")))
+        await db.commit()
+
+    for label, quantity in (("insert", 10), ("update", 20)):
+        products = [
+            (i, ProductCreate(name=f"{NAME_PREFIX}{i}", description="Synced", price=1.0, quantity=quantity))
+            for i in range(args.rows)
+        ]
+        async with sessionmaker() as db:
+            started = time.perf_counter()
+            results = await product_service.bulk_upsert_products(db, products, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+        print(f"{label}: {len(results)} rows in {elapsed:.2f}s ({len(results) / elapsed:,.0f} rows/s)")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--chunk-size", type=int, default=settings.BULK_UPSERT_CHUNK_SIZE)
+    asyncio.run(main(parser.parse_args()))
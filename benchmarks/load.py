@@ -0,0 +1,283 @@
+"""Drive the API in-process and report latency percentiles and queries per request.
+
+Seeds ``--products`` products and ``--orders`` orders into the database at
+``--database-url`` (defaults to ``DATABASE_URL``), then sends ``--requests``
+requests per scenario through ``httpx.ASGITransport`` with ``--concurrency``
+concurrent clients::
+
+    python -m benchmarks.load --database-url sqlite+aiosqlite:///bench.db --output before.json
+    python -m benchmarks.load --database-url sqlite+aiosqlite:///bench.db --baseline before.json
+
+Order sizes and product popularity are skewed the way real order streams are:
+most orders have one or two lines and a few products appear in most orders.
+Results are written as JSON so runs on different commits can be compared.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.core.metrics import QueryStats, record_queries
+from app.db.base import Base
+from app.db.session import get_db, get_engine, get_read_db, get_sessionmaker
+from app.main import create_app
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.schemas.order import OrderStatus
+
+NAME_PREFIX = "bench-load-"
+# share of orders with 1, 2, 3, ... lines
+LINES_PER_ORDER_WEIGHTS = [45, 25, 14, 8, 4, 2, 1, 1]
+STATUS_WEIGHTS = {
+    OrderStatus.delivered: 60,
+    OrderStatus.shipped: 15,
+    OrderStatus.in_progress: 20,
+    OrderStatus.cancelled: 5,
+}
+
+
+def product_weights(count: int, skew: float = 1.1) -> List[float]:
+    """Zipf-like popularity: the product of rank ``r`` is ordered ``1 / r ** skew`` as often as the top one."""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def order_lines(rng: random.Random, product_ids: List[int], weights: List[float]) -> Dict[int, int]:
+    lines = rng.choices(range(1, len(LINES_PER_ORDER_WEIGHTS) + 1), LINES_PER_ORDER_WEIGHTS)[0]
+    chosen = set(rng.choices(product_ids, weights, k=lines))
+    return {product_id: rng.choice((1, 1, 1, 2, 3, 5)) for product_id in chosen}
+
+
+async def seed(sessionmaker, products: int, orders: int, rng: random.Random) -> List[int]:
+    """Replace previously seeded benchmark data and return the seeded product ids."""
+    async with sessionmaker() as db:
+        batch = 5_000
+        product_ids = select(Product.id).where(Product.name.like(f"{NAME_PREFIX}%"))
+        # only orders with a line on a benchmark product; other orders in the database are left alone
+        order_ids = list((await db.execute(
+            select(OrderItem.order_id).where(OrderItem.product_id.in_(product_ids)).distinct()
+        )).scalars())
+        for start in range(0, len(order_ids), batch):
+            chunk = order_ids[start:start + batch]
+            await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(chunk)))
+            await db.execute(delete(Order).where(Order.id.in_(chunk)))
+        await db.execute(delete(Product).where(Product.name.like(f"{NAME_PREFIX}%")))
+
+        for start in range(0, products, batch):
+            await db.execute(
+                insert(Product),
+                [
+                    {
+                        "name": f"{NAME_PREFIX}{i}",
+                        "description": f"Benchmark product {i}",
+                        "price": round(rng.uniform(1, 500), 2),
+                        "quantity": 10_000_000,
+                    }
+                    for i in range(start, min(start + batch, products))
+                ],
+            )
+        ids = list((await db.execute(
+            select(Product.id).where(Product.name.like(f"{NAME_PREFIX}%")).order_by(Product.id)
+        )).scalars())
+
+        weights = product_weights(len(ids))
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        now = datetime.utcnow()
+        for start in range(0, orders, batch):
+            size = min(batch, orders - start)
+            rows = [
+                {
+                    "created_at": now - timedelta(seconds=rng.uniform(0, 90 * 24 * 3600)),
+                    "status": rng.choices(statuses, status_weights)[0],
+                }
+                for _ in range(size)
+            ]
+            result = await db.execute(insert(Order).returning(Order.id), rows)
+            items = [
+                {"order_id": order_id, "product_id": product_id, "quantity": quantity}
+                for order_id in result.scalars()
+                for product_id, quantity in order_lines(rng, ids, weights).items()
+            ]
+            await db.execute(insert(OrderItem), items)
+        await db.commit()
+    return ids
+
+
+def scenarios(product_ids: List[int]) -> Dict[str, Callable[[AsyncClient, random.Random], Any]]:
+    weights = product_weights(len(product_ids))
+
+    def create_order(client, rng):
+        lines = order_lines(rng, product_ids, weights)
+        items = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+        return client.post("/api/v1/orders/", json={"items": items})
+
+    def list_products(client, rng):
+        return client.get("/api/v1/products/", params={"limit": 100})
+
+    def list_orders(client, rng):
+        params = {"limit": 100, "sort": "-created_at"}
+        if rng.random() < 0.5:
+            params["status"] = "in_progress"
+        return client.get("/api/v1/orders/", params=params)
+
+    def update_product(client, rng):
+        product_id = rng.choices(product_ids, weights)[0]
+        return client.put(f"/api/v1/products/{product_id}", json={"price": round(rng.uniform(1, 500), 2)})
+
+    return {
+        "create_order": create_order,
+        "list_products": list_products,
+        "list_orders": list_orders,
+        "update_product": update_product,
+    }
+
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[max(math.ceil(p / 100 * len(sorted_samples)) - 1, 0)]
+
+
+async def run_scenario(client: AsyncClient, request, total: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors: Dict[str, int] = {}
+    remaining = iter(range(total))
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        for _ in remaining:
+            stats = QueryStats()
+            started = time.perf_counter()
+            with record_queries(stats):
+                response = await request(client, rng)
+            latencies.append(time.perf_counter() - started)
+            queries.append(stats.count)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": {
+            name: round(percentile(latencies, p) * 1000, 2)
+            for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "queries_per_request": {"mean": round(sum(queries) / len(queries), 2), "max": max(queries)},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    print(f"{'scenario':<16} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        line = (
+            f"{name:<16} {result['throughput_rps']:>8.1f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+            f"{latency['p99']:>8.2f} {result['queries_per_request']['mean']:>8.2f} {sum(result['errors'].values()):>7}"
+        )
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous and previous["latency_ms"]["p95"]:
+            change = latency["p95"] / previous["latency_ms"]["p95"] - 1
+            line += f"   p95 {change:+.1%} vs {baseline['commit']}"
+        print(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = get_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = get_sessionmaker(engine)
+    rng = random.Random(args.seed)
+    if not args.skip_seed:
+        product_ids = await seed(sessionmaker, args.products, args.orders, rng)
+    else:
+        async with sessionmaker() as db:
+            product_ids = list((await db.execute(
+                select(Product.id).where(Product.name.like(f"{NAME_PREFIX}%")).order_by(Product.id)
+            )).scalars())
+
+    app = create_app()
+
+    async def override_get_db():
+        async with sessionmaker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "database": make_url(args.database_url).get_backend_name(),
+        "python": platform.python_version(),
+        "config": {
+            "products": args.products,
+            "orders": args.orders,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "product_cache": settings.PRODUCT_CACHE_ENABLED,
+        },
+        "scenarios": {},
+    }
+    selected = scenarios(product_ids)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for name in args.scenario or selected:
+            # warm up connections and caches before measuring
+            await run_scenario(client, selected[name], min(args.concurrency * 2, args.requests), args.concurrency, args.seed)
+            results["scenarios"][name] = await run_scenario(
+                client, selected[name], args.requests, args.concurrency, args.seed
+            )
+    await engine.dispose()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=1_000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios([1])), help="run only these")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data seeded by a previous run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare p95 latency against")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""Compare order creation throughput and latency with and without the order batcher.
+
+Seeds products and orders the way ``benchmarks.load`` does, then sends
+``--requests`` orders per mode through ``httpx.ASGITransport`` with
+``--concurrency`` concurrent clients: once with one transaction per order and
+once per ``--window`` with ``ORDER_BATCH_ENABLED``::
+
+    python -m benchmarks.order_batching --database-url sqlite+aiosqlite:///bench.db --window 0.002 --window 0.005
+
+Batching pays off when commits dominate, i.e. on a database that flushes its
+log on every commit; each batched order also waits up to the window.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+from datetime import datetime
+from typing import Any, Dict
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import get_db, get_engine, get_read_db, get_sessionmaker
+from app.main import create_app
+from app.services.order import order_batcher
+from benchmarks.load import git_commit, run_scenario, scenarios, seed
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = get_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = get_sessionmaker(engine)
+    product_ids = await seed(sessionmaker, args.products, 0, random.Random(args.seed))
+    create_order = scenarios(product_ids)["create_order"]
+
+    app = create_app()
+
+    async def override_get_db():
+        async with sessionmaker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "database": make_url(args.database_url).get_backend_name(),
+        "python": platform.python_version(),
+        "config": {
+            "products": args.products, "requests": args.requests, "concurrency": args.concurrency,
+            "max_batch_size": args.max_batch_size, "seed": args.seed,
+        },
+        "modes": {},
+    }
+    order_batcher.max_size = args.max_batch_size
+    modes = [("unbatched", None)] + [(f"window_{window * 1000:g}ms", window) for window in args.window]
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for mode, window in modes:
+            settings.ORDER_BATCH_ENABLED = window is not None
+            order_batcher.window = window or 0
+            await run_scenario(client, create_order, min(20, args.requests), args.concurrency, args.seed)
+            results["modes"][mode] = await run_scenario(
+                client, create_order, args.requests, args.concurrency, args.seed
+            )
+    await engine.dispose()
+
+    print(f"{'mode':<16} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, result in results["modes"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{mode:<16} {result['throughput_rps']:>8.1f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+            f"{latency['p99']:>8.2f} {sum(result['errors'].values()):>7}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--products", type=int, default=1_000)
+    parser.add_argument("--requests", type=int, default=2_000, help="orders per mode")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--window", type=float, action="append", help="batch windows in seconds; defaults to 0.002 and 0.005")
+    parser.add_argument("--max-batch-size", type=int, default=settings.ORDER_BATCH_MAX_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    args.window = args.window or [0.002, 0.005]
+    asyncio.run(main(args))
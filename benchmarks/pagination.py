@@ -0,0 +1,87 @@
+"""Compare OFFSET and keyset page latency at increasing depths.
+
+Seeds ``--rows`` products into the database at ``--database-url`` (defaults to
+``DATABASE_URL``) and times fetching one page at each depth through
+``product_service.get_products``, once with ``skip`` and once with ``cursor``::
+
+    python -m benchmarks.pagination --rows 200000 --page-size 100
+
+OFFSET latency grows with depth because the skipped rows are still scanned;
+keyset latency stays flat because ``WHERE id > :cursor`` seeks the primary key.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, func, insert, select
+
+from app.core.config import settings
+from app.core.pagination import encode_cursor
+from app.db.base import Base
+from app.db.session import get_engine, get_sessionmaker
+from app.models.product import Product
+from app.services import product as product_service
+
+NAME_PREFIX = "bench-pagination-"
+
+
+async def seed(sessionmaker, rows: int) -> None:
+    async with sessionmaker() as db:
+        existing = await db.scalar(select(func.count()).where(Product.name.like(f"{NAME_PREFIX}%")))
+        if existing == rows:
+            return
+        await db.execute(delete(Product).where(Product.name.like(f"{NAME_PREFIX}%")))
+        batch = 10_000
+        for start in range(0, rows, batch):
+            await db.execute(
+                insert(Product),
+                [
+                    {"name": f"{NAME_PREFIX}{i}", "description": None, "price": 1.0, "quantity": 1}
+                    for i in range(start, min(start + batch, rows))
+                ],
+            )
+        await db.commit()
+
+
+async def time_page(sessionmaker, repeat: int, **kwargs) -> float:
+    samples = []
+    for _ in range(repeat):
+        async with sessionmaker() as db:
+            started = time.perf_counter()
+            await product_service.get_products(db, **kwargs)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = get_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = get_sessionmaker(engine)
+    await seed(sessionmaker, args.rows)
+
+    print(f"{'depth':>10} {'offset ms':>10} {'keyset ms':>10}")
+    depth = args.page_size
+    while depth < args.rows:
+        async with sessionmaker() as db:
+            boundary = await db.scalar(select(Product.id).order_by(Product.id).offset(depth - 1).limit(1))
+        offset_ms = await time_page(sessionmaker, args.repeat, skip=depth, limit=args.page_size)
+        keyset_ms = await time_page(
+            sessionmaker,
+            args.repeat,
+            limit=args.page_size,
+            cursor=encode_cursor(boundary),
+        )
+        print(f"{depth:>10} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+        depth *= 4
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""Compare the cost of building list responses from ORM objects and from plain rows.
+
+Seeds products and orders the way ``benchmarks.load`` does, then times, for
+each page size, loading a page and encoding it as JSON:
+
+* ``orm``: load mapped instances (orders with ``selectinload``) and validate
+  them with ``from_attributes`` before encoding, as the list endpoints used to;
+* ``rows``: select the columns and validate the rows with the list
+  ``TypeAdapter``, as ``get_products`` and ``get_orders`` do now.
+
+    python -m benchmarks.serialization --database-url sqlite+aiosqlite:///bench.db
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import get_engine, get_sessionmaker
+from app.models.order import Order
+from app.models.product import Product
+from app.schemas.order import order_list_adapter
+from app.schemas.product import product_list_adapter
+from app.services import order as order_service
+from app.services import product as product_service
+from benchmarks.load import seed
+
+
+async def orm_products(db, limit: int) -> bytes:
+    products = (await db.execute(select(Product).order_by(Product.id).limit(limit))).scalars().all()
+    return product_list_adapter.dump_json(product_list_adapter.validate_python(products, from_attributes=True))
+
+
+async def row_products(db, limit: int) -> bytes:
+    return product_list_adapter.dump_json(await product_service.get_products(db, limit=limit))
+
+
+async def orm_orders(db, limit: int) -> bytes:
+    query = select(Order).options(selectinload(Order.items)).order_by(Order.created_at, Order.id).limit(limit)
+    orders = (await db.execute(query)).scalars().all()
+    return order_list_adapter.dump_json(order_list_adapter.validate_python(orders, from_attributes=True))
+
+
+async def row_orders(db, limit: int) -> bytes:
+    return order_list_adapter.dump_json(await order_service.get_orders(db, limit=limit))
+
+
+VARIANTS: Dict[str, Dict[str, Callable[..., Awaitable[bytes]]]] = {
+    "products": {"orm": orm_products, "rows": row_products},
+    "orders": {"orm": orm_orders, "rows": row_orders},
+}
+
+
+async def time_variant(sessionmaker, build, limit: int, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        # a fresh session each round, so the identity map does not hand back already loaded objects
+        async with sessionmaker() as db:
+            started = time.perf_counter()
+            await build(db, limit)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = get_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = get_sessionmaker(engine)
+    if not args.skip_seed:
+        await seed(sessionmaker, args.products, args.orders, random.Random(args.seed))
+
+    print(f"{'endpoint':<10} {'page':>6} {'orm ms':>9} {'rows ms':>9} {'speedup':>8}")
+    for name, variants in VARIANTS.items():
+        for limit in args.page_size:
+            async with sessionmaker() as db:
+                assert await variants["orm"](db, limit) == await variants["rows"](db, limit)
+            medians = {
+                variant: statistics.median(await time_variant(sessionmaker, build, limit, args.repeat))
+                for variant, build in variants.items()
+            }
+            print(
+                f"{name:<10} {limit:>6} {medians['orm'] * 1000:>9.2f} {medians['rows'] * 1000:>9.2f} "
+                f"{medians['orm'] / medians['rows']:>7.2f}x"
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--orders", type=int, default=5_000)
+    parser.add_argument("--page-size", type=int, action="append", help="defaults to 100 and 1000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data seeded by a previous run")
+    args = parser.parse_args()
+    args.page_size = args.page_size or [100, 1000]
+    asyncio.run(main(args))
@@ -0,0 +1,50 @@
+"""Foreign-key, keyset and active-order indexes on the order tables
+
+Revision ID: 0003_order_indexes
+Revises: 0002_idempotency_keys
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_order_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_idempotency_keys"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_order_items_order_id", "order_items", ["order_id"], {}),
+    ("ix_order_items_product_id", "order_items", ["product_id"], {}),
+    ("ix_orders_created_at_id", "orders", ["created_at", "id"], {}),
+    ("ix_orders_status_created_at", "orders", ["status", "created_at"], {}),
+    (
+        "ix_orders_in_progress_created_at",
+        "orders",
+        ["created_at"],
+        {
+            "postgresql_where": sa.text("status = 'in_progress'"),
+            "sqlite_where": sa.text("status = 'in_progress'"),
+        },
+    ),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        # build without blocking writes on large tables; CONCURRENTLY cannot run in a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns, kwargs in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **kwargs)
+    else:
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, **kwargs)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,34 @@
+"""Resource id, response hash and expiry for idempotency keys
+
+Revision ID: 0005_idempotency_key_expiry
+Revises: 0004_outbox_events
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_idempotency_key_expiry"
+down_revision: Union[str, Sequence[str], None] = "0004_outbox_events"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("idempotency_keys") as batch_op:
+        batch_op.add_column(sa.Column("response_hash", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("resource_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("expires_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    with op.batch_alter_table("idempotency_keys") as batch_op:
+        batch_op.drop_column("expires_at")
+        batch_op.drop_column("resource_id")
+        batch_op.drop_column("response_hash")
@@ -0,0 +1,30 @@
+"""Version counters on products and orders
+
+Revision ID: 0006_row_versions
+Revises: 0005_idempotency_key_expiry
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_row_versions"
+down_revision: Union[str, Sequence[str], None] = "0005_idempotency_key_expiry"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("products", "orders"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    for table in ("orders", "products"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("version")
@@ -0,0 +1,39 @@
+"""Trigram indexes for product search
+
+Revision ID: 0007_product_search_indexes
+Revises: 0006_row_versions
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_product_search_indexes"
+down_revision: Union[str, Sequence[str], None] = "0006_row_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite has no trigram indexes; product search scans there
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in ("name", "description"):
+        op.create_index(
+            f"ix_products_{column}_trgm",
+            "products",
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_products_description_trgm", table_name="products")
+    op.drop_index("ix_products_name_trgm", table_name="products")
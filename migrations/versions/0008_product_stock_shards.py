@@ -0,0 +1,43 @@
+"""Sharded stock counters for hot products
+
+Revision ID: 0008_product_stock_shards
+Revises: 0007_product_search_indexes
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_product_stock_shards"
+down_revision: Union[str, Sequence[str], None] = "0007_product_search_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("stock_slots", sa.Integer(), server_default="0", nullable=False))
+    op.create_table(
+        "product_stock_shards",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("slot", sa.Integer(), primary_key=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+        sa.CheckConstraint("quantity >= 0", name="ck_product_stock_shards_quantity"),
+    )
+
+
+def downgrade() -> None:
+    # fold sharded stock back into the product rows
+    op.execute(
+        "UPDATE products SET quantity = quantity + "
+        "(SELECT COALESCE(SUM(quantity), 0) FROM product_stock_shards WHERE product_id = products.id) "
+        "WHERE stock_slots > 0"
+    )
+    op.drop_table("product_stock_shards")
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("stock_slots")
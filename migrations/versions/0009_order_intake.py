@@ -0,0 +1,48 @@
+"""Queue table for orders accepted with 202 and created by background workers
+
+Revision ID: 0009_order_intake
+Revises: 0008_product_stock_shards
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_order_intake"
+down_revision: Union[str, Sequence[str], None] = "0008_product_stock_shards"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+order_intake_status = sa.Enum("queued", "completed", "failed", name="orderintakestatus")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_intake",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", order_intake_status, nullable=False),
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.id"), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_order_intake_id", "order_intake", ["id"])
+    op.create_index(
+        "ix_order_intake_queued",
+        "order_intake",
+        ["id"],
+        postgresql_where=sa.text("status = 'queued'"),
+        sqlite_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_intake_queued", table_name="order_intake")
+    op.drop_index("ix_order_intake_id", table_name="order_intake")
+    op.drop_table("order_intake")
+    order_intake_status.drop(op.get_bind(), checkfirst=True)
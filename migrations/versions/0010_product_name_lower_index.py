@@ -0,0 +1,30 @@
+"""Index on lower(name) for exact and prefix product name search
+
+Revision ID: 0010_product_name_lower_index
+Revises: 0009_order_intake
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_product_name_lower_index"
+down_revision: Union[str, Sequence[str], None] = "0009_order_intake"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # text_pattern_ops lets PostgreSQL serve LIKE 'prefix%' from the index whatever the collation
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_index("ix_products_name_lower", "products", [sa.text("lower(name) text_pattern_ops")])
+    else:
+        op.create_index("ix_products_name_lower", "products", [sa.text("lower(name)")])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_products_name_lower", table_name="products")
@@ -1,65 +1,108 @@
-import asyncio
+import os
 
 import pytest
-from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from app.main import create_app
-from app.db.base import Base
-from app.db.session import get_db
 from app.core.config import settings
 
-DATABASE_URL_TEST = settings.DATABASE_URL_TEST
 
-engine_test = create_async_engine(
-    DATABASE_URL_TEST,
-    echo=False,
-    future=True,
-)
+def worker_database_url(url: str) -> str:
+    """Give each pytest-xdist worker its own SQLite database file."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    parsed = make_url(url)
+    if worker is None or parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return url
+    stem, dot, suffix = parsed.database.rpartition(".")
+    database = f"{stem}_{worker}.{suffix}" if dot else f"{parsed.database}_{worker}"
+    return parsed.set(database=database).render_as_string(hide_password=False)
 
-AsyncSessionLocal_test = sessionmaker(
-    bind=engine_test, class_=AsyncSession, expire_on_commit=False
-)
 
+settings.DATABASE_URL_TEST = worker_database_url(settings.DATABASE_URL_TEST)
+# the app's engine is created from DATABASE_URL on import, so point it at the test database first
+settings.DATABASE_URL = settings.DATABASE_URL_TEST
 
-@pytest.fixture(scope="session")
-def event_loop():
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+from app.core import metrics  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.session import AsyncSessionLocal, engine, get_db, get_read_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.product import product_cache  # noqa: E402
 
 
-@pytest.fixture(scope="session", autouse=True)
+@pytest_asyncio.fixture(scope="session", loop_scope="session", autouse=True)
 async def prepare_database():
-    async with engine_test.begin() as conn:
+    async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    # each test runs on its own event loop; asyncpg connections must not outlive theirs
+    await engine.dispose()
     yield
-    async with engine_test.begin() as conn:
+    async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
-
-
-@pytest.fixture(scope="function")
-async def db_session():
-    async with AsyncSessionLocal_test() as session:
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+async def db_sessionmaker(request):
+    """Run each test in a transaction that is rolled back afterwards.
+
+    Sessions handed to the app join that transaction through a SAVEPOINT, so
+    service code can commit as usual while nothing outlives the test. Tests that
+    need real concurrent transactions are marked ``commits`` and use the app's
+    own sessions; they must use data nothing else depends on.
+    """
+    if request.node.get_closest_marker("commits"):
+        yield AsyncSessionLocal
+        await product_cache.clear()
+        # the pool's queue binds to this test's event loop once a checkout has to wait
+        await engine.dispose()
+        return
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        test_sessionmaker = sessionmaker(
+            bind=conn, class_=AsyncSession, expire_on_commit=False, join_transaction_mode="create_savepoint"
+        )
+
+        async def override_get_db():
+            async with test_sessionmaker() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        try:
+            yield test_sessionmaker
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            app.dependency_overrides.pop(get_read_db, None)
+            await transaction.rollback()
+            # rolled back ids are reused, so cached products must not survive the test
+            await product_cache.clear()
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db_session(db_sessionmaker):
+    async with db_sessionmaker() as session:
         yield session
 
 
-@pytest.fixture(scope="function")
-async def app(db_session):
-    settings.DATABASE_URL = settings.DATABASE_URL_TEST
-
-    app = create_app()
+@pytest.fixture
+def query_budget():
+    """``with query_budget(n): ...`` fails the test if the block executes more than ``n`` SQL statements."""
+    return metrics.query_budget
 
-    async def override_get_db():
-        async with AsyncSessionLocal_test() as session:
-            yield session
 
-    app.dependency_overrides[get_db] = override_get_db
-    return app
+@pytest.fixture
+def create_product():
+    """``await create_product(name, quantity=10)`` creates a product through the API and returns its id."""
+    client = AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
 
+    async def create(name: str, quantity: int = 10) -> int:
+        response = await client.post(
+            "/api/v1/products/", json={"name": name, "description": "d", "price": 2.0, "quantity": quantity}
+        )
+        return response.json()["id"]
 
-@pytest.fixture(scope="function")
-async def client(app):
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        yield ac
+    return create
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from app.core.admission import AdaptiveLimit, AdmissionController, AdmissionMiddleware, route_class
+from app.core.config import settings
+from app.main import create_app
+
+
+def test_limit_shrinks_when_latency_grows_and_recovers():
+    limit = AdaptiveLimit(initial=20, min_limit=2, max_limit=50)
+    for _ in range(50):
+        limit.observe(0.01, in_flight=int(limit.limit))
+    assert limit.limit == 50
+
+    for _ in range(20):
+        limit.observe(0.2, in_flight=int(limit.limit))
+    assert limit.limit < 20
+
+    overloaded = limit.limit
+    for _ in range(50):
+        limit.observe(0.01, in_flight=int(limit.limit))
+    assert limit.limit > overloaded
+
+    # an idle class does not grow its limit
+    idle = AdaptiveLimit(initial=10, min_limit=2, max_limit=50)
+    for _ in range(50):
+        idle.observe(0.01, in_flight=1)
+    assert idle.limit == 10
+
+
+def test_only_order_creation_gets_the_orders_class():
+    assert route_class("POST", "/api/v1/orders/") == "orders"
+    assert route_class("POST", "/api/v1/orders/intake") == "writes"
+    assert route_class("POST", "/api/v1/orders/status-transitions") == "writes"
+    assert route_class("GET", "/api/v1/orders/") == "reads"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_requests_over_the_limit_queue_briefly_and_are_shed():
+    release = asyncio.Event()
+    inner = FastAPI()
+
+    @inner.get("/api/v1/products/")
+    @inner.post("/api/v1/orders/")
+    async def busy():
+        await release.wait()
+        return {}
+
+    controller = AdmissionController(initial_limit=1, min_limit=1, max_limit=1, queue_timeout=0.5, max_queue=1)
+    admission_app = AdmissionMiddleware(inner, controller=controller, retry_after=3)
+    admission_client = AsyncClient(transport=ASGITransport(app=admission_app), base_url="http://test")
+
+    first_order = asyncio.ensure_future(admission_client.post("/api/v1/orders/"))
+    await asyncio.sleep(0.01)
+    queued_order = asyncio.ensure_future(admission_client.post("/api/v1/orders/"))
+    await asyncio.sleep(0.01)
+    full = await admission_client.post("/api/v1/orders/")
+    assert full.status_code == 503
+    assert full.headers["Retry-After"] == "3"
+    # reads have a free slot, but yield to the waiting order
+    assert (await admission_client.get("/api/v1/products/")).status_code == 503
+    assert controller.stats()["waiting"] == {"orders": 1, "writes": 0, "reads": 0}
+
+    release.set()
+    assert [r.status_code for r in await asyncio.gather(first_order, queued_order)] == [200, 200]
+    assert controller.stats()["in_flight"]["orders"] == 0
+
+    release.clear()
+    first_read = asyncio.ensure_future(admission_client.get("/api/v1/products/"))
+    await asyncio.sleep(0.01)
+    timed_out = await admission_client.get("/api/v1/products/")
+    assert timed_out.status_code == 503
+    release.set()
+    assert (await first_read).status_code == 200
+    assert controller.stats()["in_flight"]["reads"] == 0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_admission_control_metrics(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL_ENABLED", True)
+    admitted_client = AsyncClient(transport=ASGITransport(app=create_app()), base_url="http://test")
+
+    assert (await admitted_client.get("/api/v1/products/", params={"limit": 1})).status_code == 200
+    metrics = (await admitted_client.get("/metrics")).text
+    assert f'admission_limit{{route_class="reads"}} {float(settings.ADMISSION_INITIAL_LIMIT)}' in metrics
+    assert 'admission_in_flight{route_class="reads"} 0' in metrics
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from app.core.batching import MicroBatcher
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_cancelled_leader_waits_for_its_running_batch():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def run_batch(db, items):
+        started.set()
+        await release.wait()
+        return [f"{db}:{item}" for item in items]
+
+    batcher = MicroBatcher(run_batch, window=0.01, max_size=10)
+    leader = asyncio.create_task(batcher.submit("leader-session", 1))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(batcher.submit("follower-session", 2))
+    await started.wait()
+
+    leader.cancel()
+    await asyncio.sleep(0.01)
+    # the batch still uses the leader's session, so the leader must not return yet
+    assert not leader.done()
+
+    release.set()
+    assert await follower == "leader-session:2"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_followers_cancelled_during_the_window_are_left_out():
+    batches = []
+
+    async def run_batch(db, items):
+        batches.append(items)
+        return [f"{db}:{item}" for item in items]
+
+    batcher = MicroBatcher(run_batch, window=0.05, max_size=10)
+    leader = asyncio.create_task(batcher.submit("leader-session", 1))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(batcher.submit("cancelled-session", 2))
+    follower = asyncio.create_task(batcher.submit("follower-session", 3))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    assert await leader == "leader-session:1"
+    assert await follower == "leader-session:3"
+    assert batches == [[1, 3]]
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from starlette.requests import Request
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.db.session import (
+    MeteredQueuePool,
+    ReadReplicaRouter,
+    engine_options,
+    get_sessionmaker,
+    pool_status,
+    read_db_dependency,
+)
+
+
+def make_request(headers=()):
+    return Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers]})
+
+
+def test_engine_options_for_postgres():
+    options = engine_options("postgresql+asyncpg://user:password@db:5432/warehouse")
+    assert options["poolclass"] is MeteredQueuePool
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["connect_args"] == {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_pool_metrics_record_checkouts_and_timeouts():
+    engine = create_async_engine(
+        settings.DATABASE_URL_TEST, poolclass=MeteredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert pool_status(engine)["checkedout"] == 1
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+        status = pool_status(engine)
+        assert status["acquired"] == 1
+        assert status["timeouts"] == 1
+        assert status["checkedout"] == 0
+    finally:
+        await engine.dispose()
+
+
+def test_read_replica_router_round_robin_and_mark_down():
+    now = [0.0]
+    engines = [create_async_engine(settings.DATABASE_URL_TEST) for _ in range(3)]
+    router = ReadReplicaRouter(engines, retry_after=10.0, clock=lambda: now[0])
+    firsts = [router.candidates()[0][0] for _ in range(3)]
+    assert sorted(firsts) == [0, 1, 2]
+
+    router.mark_down(1)
+    assert all(index != 1 for _ in range(3) for index, _ in router.candidates())
+    now[0] = 10.0
+    assert 1 in [index for index, _ in router.candidates()]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_db_falls_back_to_primary():
+    primary = create_async_engine(settings.DATABASE_URL_TEST)
+    broken = create_async_engine("sqlite+aiosqlite:////nonexistent-dir/replica.db")
+    healthy = create_async_engine(settings.DATABASE_URL_TEST)
+    router = ReadReplicaRouter([broken], retry_after=60.0)
+    dependency = read_db_dependency(get_sessionmaker(primary), router)
+    try:
+        sessions = dependency(make_request())
+        session = await sessions.__anext__()
+        assert session.bind is primary
+        await sessions.aclose()
+        assert router.candidates() == []
+
+        router = ReadReplicaRouter([healthy])
+        dependency = read_db_dependency(get_sessionmaker(primary), router)
+        sessions = dependency(make_request())
+        assert (await sessions.__anext__()).bind is healthy
+        await sessions.aclose()
+
+        sessions = dependency(make_request([("X-Read-Consistency", "primary")]))
+        assert (await sessions.__anext__()).bind is primary
+        await sessions.aclose()
+    finally:
+        for engine in (primary, broken, healthy):
+            await engine.dispose()
+
+
+# SQLite cannot reflect expression indexes such as ix_products_name_lower, so they are not compared
+@pytest.mark.filterwarnings("ignore:.*expression-based index")
+def test_migrations_match_models(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.migration import MigrationContext
+    from sqlalchemy import create_engine
+
+    import app.models  # noqa: F401
+    from app.db.base import Base
+    from app.db.dialect import include_object_for
+
+    path = tmp_path / "migrations.db"
+    config = Config("alembic.ini")
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    # env.py calls asyncio.run(), which must not replace the test session's event loop
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(command.upgrade, config, "head").result()
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn, opts={"include_object": include_object_for("sqlite")})
+        assert compare_metadata(context, Base.metadata) == []
+    engine.dispose()
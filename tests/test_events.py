@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.core.config import settings
+from app.main import app
+from app.services.outbox import FileSink, InMemorySink, OutboxDispatcher, event_stream, get_events
+
+transport = ASGITransport(app=app)
+client = AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.fixture(autouse=True)
+def no_visibility_delay(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_VISIBILITY_DELAY", 0)
+
+
+async def latest_event_id() -> int:
+    response = await client.get("/api/v1/events/", params={"limit": 1000})
+    events = response.json()
+    while len(events) == 1000:
+        response = await client.get("/api/v1/events/", params={"after": events[-1]["id"], "limit": 1000})
+        events = response.json() or events
+    return events[-1]["id"] if events else 0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_changes_are_recorded_as_events():
+    after = await latest_event_id()
+    product_response = await client.post(
+        "/api/v1/products/", json={"name": "Evented Product", "description": "d", "price": 3.0, "quantity": 10}
+    )
+    product_id = product_response.json()["id"]
+    await client.put(f"/api/v1/products/{product_id}", json={"price": 4.0})
+    order_response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 2}]})
+    order_id = order_response.json()["id"]
+    await client.patch(f"/api/v1/orders/{order_id}/status", json={"status": "cancelled"})
+
+    response = await client.get("/api/v1/events/", params={"after": after})
+    assert response.status_code == 200
+    events = response.json()
+    assert [e["event_type"] for e in events] == [
+        "product.created",
+        "product.updated",
+        "order.created",
+        "order.status_changed",
+    ]
+    assert events[1]["payload"]["price"] == 4.0
+    assert events[2]["aggregate_id"] == order_id
+    assert events[2]["payload"]["items"][0]["quantity"] == 2
+    assert events[3]["payload"] == {"id": order_id, "status": "cancelled"}
+    assert [e["id"] for e in events] == sorted(e["id"] for e in events)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_failed_change_records_no_event():
+    product_response = await client.post(
+        "/api/v1/products/", json={"name": "Evented Scarce", "description": "d", "price": 1.0, "quantity": 1}
+    )
+    product_id = product_response.json()["id"]
+    after = await latest_event_id()
+    response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 5}]})
+    assert response.status_code == 400
+
+    assert (await client.get("/api/v1/events/", params={"after": after})).json() == []
+
+
+@pytest.mark.commits
+@pytest.mark.asyncio(loop_scope="function")
+async def test_long_poll_returns_when_an_event_is_committed():
+    after = await latest_event_id()
+    poll = asyncio.create_task(client.get("/api/v1/events/", params={"after": after, "wait": 5}))
+    await asyncio.sleep(0.1)
+    assert not poll.done()
+    await client.post(
+        "/api/v1/products/", json={"name": "Long Polled", "description": "d", "price": 1.0, "quantity": 1}
+    )
+
+    response = await asyncio.wait_for(poll, 2)
+    assert [e["payload"]["name"] for e in response.json()] == ["Long Polled"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_sse_stream_resumes_after_last_event(db_session):
+    after = await latest_event_id()
+    await client.post("/api/v1/products/", json={"name": "Streamed", "description": "d", "price": 1.0, "quantity": 1})
+
+    stream = event_stream(db_session, after=after, limit=10, keepalive=1)
+    message = await stream.__anext__()
+    await stream.aclose()
+    lines = message.strip().split("\n")
+    assert lines[0] == f"id: {after + 1}"
+    assert lines[1] == "event: product.created"
+    assert json.loads(lines[2][len("data: "):])["payload"]["name"] == "Streamed"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_dispatcher_delivers_pending_events_once(tmp_path, db_sessionmaker):
+    await client.post("/api/v1/products/", json={"name": "Dispatched", "description": "d", "price": 1.0, "quantity": 1})
+    sink = InMemorySink()
+    dispatcher = OutboxDispatcher(db_sessionmaker, sink, batch_size=1000)
+    while await dispatcher.dispatch_once():
+        pass
+    assert "Dispatched" in [e["payload"].get("name") for e in sink.events]
+    assert await dispatcher.dispatch_once() == 0
+
+    await client.post("/api/v1/products/", json={"name": "Dispatched Again", "description": "d", "price": 1.0, "quantity": 1})
+    file_sink = FileSink(str(tmp_path / "outbox.ndjson"))
+    assert await OutboxDispatcher(db_sessionmaker, file_sink).dispatch_once() == 1
+    written = [json.loads(line) for line in (tmp_path / "outbox.ndjson").read_text().splitlines()]
+    assert written[0]["payload"]["name"] == "Dispatched Again"
+
+    async with db_sessionmaker() as db:
+        assert await get_events(db, after=written[0]["id"]) == []
@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import DBAPIError
+from app.core.config import settings
+from app.core.metrics import Histogram, QueryStats, record_queries
+from app.models.product import Product
+from app.main import app, create_app
+
+transport = ASGITransport(app=app)
+client = AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", labels=("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "/a")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 4.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_metrics_report_latency_and_queries_per_route():
+    product_response = await client.post(
+        "/api/v1/products/", json={"name": "Metered Product", "description": "d", "price": 1.0, "quantity": 5}
+    )
+    product_id = product_response.json()["id"]
+    await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    route = 'method="GET",route="/api/v1/products/{product_id}"'
+    assert any(line.startswith(f'http_request_duration_seconds_count{{{route},status="200"}}') for line in lines)
+    query_count = next(line for line in lines if line.startswith(f"db_queries_per_request_sum{{{route}}}"))
+    assert float(query_count.split()[-1]) >= 1
+    assert any(line.startswith("product_cache_misses ") for line in lines)
+    assert not any(f"/api/v1/products/{product_id}" in line for line in lines)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_query_stats_count_rows_read_and_written(db_session):
+    db_session.add_all([Product(name=f"Counted Product {i}", price=1.0, quantity=1) for i in range(3)])
+    await db_session.flush()
+    with record_queries(QueryStats()) as stats:
+        result = await db_session.execute(select(Product.id).where(Product.name.like("Counted Product %")))
+        assert len(result.all()) == 3
+        await db_session.execute(update(Product).where(Product.name.like("Counted Product %")).values(quantity=2))
+    assert (stats.count, stats.rows) == (2, 6)
+
+    connection = await db_session.connection()
+    with record_queries(QueryStats()):
+        with pytest.raises(DBAPIError):
+            await db_session.execute(text("SELECT * FROM no_such_table"))
+    # the failed statement's timer must not be left for the next statement to pop
+    assert not connection.sync_connection.info.get("query_started")
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_slow_request_log_includes_sql(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "METRICS_SLOW_REQUEST_SECONDS", 0)
+    slow_client = AsyncClient(transport=ASGITransport(app=create_app()), base_url="http://test")
+
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        await slow_client.get("/api/v1/orders/", params={"limit": 1})
+
+    assert "Slow request GET /api/v1/orders/" in caplog.text
+    assert "FROM orders" in caplog.text
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_sampled_requests_over_budget_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "QUERY_BUDGET_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "QUERY_BUDGETS", {"GET /api/v1/orders/": 0})
+    sampled_app = create_app()
+    sampled_client = AsyncClient(transport=ASGITransport(app=sampled_app), base_url="http://test")
+
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        await sampled_client.get("/api/v1/products/", params={"limit": 1})
+        assert "budget" not in caplog.text
+        await sampled_client.get("/api/v1/orders/", params={"limit": 1})
+
+    assert "budget for /api/v1/orders/ is 0" in caplog.text
+    metrics = (await sampled_client.get("/metrics")).text
+    assert 'db_query_budget_exceeded_total{method="GET",route="/api/v1/orders/"}' in metrics
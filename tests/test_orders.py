@@ -1,3 +1,9 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 from app.main import app
@@ -45,6 +51,27 @@ async def test_create_order_with_nonexistent_product():
     assert response.json()["detail"] == "Product with id 9999 does not exist."
 
 
+@pytest.mark.asyncio(loop_scope="function")
+async def test_create_order_without_items_is_rejected():
+    response = await client.post("/api/v1/orders/", json={"items": []})
+    assert response.status_code == 422
+    response = await client.post("/api/v1/orders/intake", json={"items": []})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_create_order_only_in_progress():
+    product_data = {"name": "Status On Create Product", "description": None, "price": 1.0, "quantity": 5}
+    product_id = (await client.post("/api/v1/products/", json=product_data)).json()["id"]
+    items = [{"product_id": product_id, "quantity": 2}]
+    for path in ("/api/v1/orders/", "/api/v1/orders/intake"):
+        response = await client.post(path, json={"status": "cancelled", "items": items})
+        assert response.status_code == 422
+    response = await client.post("/api/v1/orders/", json={"status": "in_progress", "items": items})
+    assert response.status_code == 201
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 3
+
+
 @pytest.mark.asyncio(loop_scope="function")
 async def test_create_order_with_insufficient_quantity():
     product_data = {
@@ -103,6 +130,19 @@ async def test_read_orders():
     assert any(order["items"][0]["product_id"] == product_id2 for order in data)
 
 
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_orders_body_matches_single_reads():
+    response = await client.post("/api/v1/products/", json={"name": "Serialized Order Ä", "price": 2.5, "quantity": 10})
+    product_id = response.json()["id"]
+    await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]})
+    await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 2}] * 2})
+
+    response = await client.get("/api/v1/orders/", params={"sort": "-created_at"})
+    assert response.headers["content-type"] == "application/json"
+    singles = [(await client.get(f"/api/v1/orders/{o['id']}")).content for o in response.json()]
+    assert response.content == b"[" + b",".join(singles) + b"]"
+
+
 @pytest.mark.asyncio(loop_scope="function")
 async def test_read_order():
     product_data = {
@@ -196,3 +236,558 @@ async def test_update_order_status_invalid_status():
     invalid_status = {"status": "unknown_status"}
     response = await client.patch(f"/api/v1/orders/{order_id}/status", json=invalid_status)
     assert response.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_create_order_with_multiple_items_decrements_stock():
+    product_ids = []
+    for index in range(3):
+        product_data = {
+            "name": f"Batch Product {index}",
+            "description": "Batched reservation",
+            "price": 10.0,
+            "quantity": 10
+        }
+        create_product_response = await client.post("/api/v1/products/", json=product_data)
+        assert create_product_response.status_code == 201
+        product_ids.append(create_product_response.json()["id"])
+
+    order_data = {
+        "items": [
+            {"product_id": product_ids[0], "quantity": 1},
+            {"product_id": product_ids[1], "quantity": 2},
+            {"product_id": product_ids[2], "quantity": 3},
+            {"product_id": product_ids[0], "quantity": 4},
+        ]
+    }
+    response = await client.post("/api/v1/orders/", json=order_data)
+    assert response.status_code == 201
+    assert len(response.json()["items"]) == 4
+
+    quantities = [
+        (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"]
+        for product_id in product_ids
+    ]
+    assert quantities == [5, 8, 7]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_create_order_failure_leaves_stock_untouched():
+    product_data = {
+        "name": "Untouched Product",
+        "description": "Stock must not change",
+        "price": 10.0,
+        "quantity": 3
+    }
+    create_product_response = await client.post("/api/v1/products/", json=product_data)
+    assert create_product_response.status_code == 201
+    product_id = create_product_response.json()["id"]
+
+    order_data = {
+        "items": [
+            {"product_id": product_id, "quantity": 2},
+            {"product_id": 9998, "quantity": 1},
+        ]
+    }
+    response = await client.post("/api/v1/orders/", json=order_data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Product with id 9998 does not exist."
+
+    order_data = {
+        "items": [
+            {"product_id": product_id, "quantity": 2},
+            {"product_id": product_id, "quantity": 2},
+        ]
+    }
+    response = await client.post("/api/v1/orders/", json=order_data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Insufficient quantity for product {product_data['name']}."
+
+    get_response = await client.get(f"/api/v1/products/{product_id}")
+    assert get_response.json()["quantity"] == 3
+
+
+@pytest.mark.commits
+@pytest.mark.asyncio(loop_scope="function")
+async def test_concurrent_orders_do_not_oversell():
+    product_data = {
+        "name": "Contended Product",
+        "description": "Hot SKU",
+        "price": 5.0,
+        "quantity": 10
+    }
+    create_product_response = await client.post("/api/v1/products/", json=product_data)
+    assert create_product_response.status_code == 201
+    product_id = create_product_response.json()["id"]
+
+    order_data = {"items": [{"product_id": product_id, "quantity": 1}]}
+    responses = await asyncio.gather(
+        *(client.post("/api/v1/orders/", json=order_data) for _ in range(40))
+    )
+    status_codes = [response.status_code for response in responses]
+    assert status_codes.count(201) == 10
+    assert all(code in (400, 409) for code in status_codes if code != 201)
+
+    get_response = await client.get(f"/api/v1/products/{product_id}")
+    assert get_response.json()["quantity"] == 0
+
+
+@pytest.mark.commits
+@pytest.mark.asyncio(loop_scope="function")
+async def test_concurrent_orders_do_not_oversell_sharded_stock():
+    create_product_response = await client.post(
+        "/api/v1/products/", json={"name": "Contended Sharded Product", "price": 5.0, "quantity": 10}
+    )
+    product_id = create_product_response.json()["id"]
+    await client.put(f"/api/v1/products/{product_id}/stock-shards", json={"slots": 4})
+
+    order_data = {"items": [{"product_id": product_id, "quantity": 1}]}
+    responses = await asyncio.gather(*(client.post("/api/v1/orders/", json=order_data) for _ in range(40)))
+    status_codes = [response.status_code for response in responses]
+    assert status_codes.count(201) == 10
+    assert all(code in (400, 409) for code in status_codes if code != 201)
+
+    get_response = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert get_response.json()["quantity"] == 0
+    # committed data outlives the test; keep other tests' product pages free of sharded rows
+    await client.put(f"/api/v1/products/{product_id}/stock-shards", json={"slots": 0})
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_orders_with_cursor():
+    product_data = {
+        "name": "Cursor Order Product",
+        "description": "Keyset pagination",
+        "price": 1.0,
+        "quantity": 100
+    }
+    create_product_response = await client.post("/api/v1/products/", json=product_data)
+    product_id = create_product_response.json()["id"]
+    for _ in range(3):
+        await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]})
+
+    all_response = await client.get("/api/v1/orders/", params={"limit": 1000})
+    expected = [order["id"] for order in all_response.json()]
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get("/api/v1/orders/", params=params)
+        assert response.status_code == 200
+        seen.extend(order["id"] for order in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert seen == expected
+
+    response = await client.get("/api/v1/orders/", params={"cursor": "W10"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_export_orders():
+    product_data = {
+        "name": "Export Order Product",
+        "description": "Exported with orders",
+        "price": 3.0,
+        "quantity": 50
+    }
+    create_product_response = await client.post("/api/v1/products/", json=product_data)
+    product_id = create_product_response.json()["id"]
+    order_data = {"items": [{"product_id": product_id, "quantity": 1}, {"product_id": product_id, "quantity": 2}]}
+    create_order_response = await client.post("/api/v1/orders/", json=order_data)
+    created = create_order_response.json()
+
+    response = await client.get("/api/v1/orders/export")
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert created in records
+
+    response = await client.get("/api/v1/orders/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = [row for row in csv.DictReader(io.StringIO(response.text)) if row["order_id"] == str(created["id"])]
+    assert [row["quantity"] for row in rows] == ["1", "2"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_orders_with_filters_and_sort():
+    product_data = {"name": "Filter Product", "description": None, "price": 1.0, "quantity": 100}
+    product_id = (await client.post("/api/v1/products/", json=product_data)).json()["id"]
+    order_ids = []
+    for _ in range(3):
+        response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]})
+        order_ids.append(response.json()["id"])
+    await client.patch(f"/api/v1/orders/{order_ids[1]}/status", json={"status": "shipped"})
+
+    response = await client.get("/api/v1/orders/", params={"product_id": product_id})
+    assert [order["id"] for order in response.json()] == order_ids
+
+    response = await client.get("/api/v1/orders/", params={"product_id": product_id, "sort": "-created_at", "limit": 2})
+    assert [order["id"] for order in response.json()] == order_ids[::-1][:2]
+    next_page = await client.get(
+        "/api/v1/orders/",
+        params={"product_id": product_id, "sort": "-created_at", "limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert [order["id"] for order in next_page.json()] == [order_ids[0]]
+
+    response = await client.get("/api/v1/orders/", params={"product_id": product_id, "status": "shipped"})
+    assert [order["id"] for order in response.json()] == [order_ids[1]]
+
+    created_at = response.json()[0]["created_at"]
+    response = await client.get(
+        "/api/v1/orders/", params={"product_id": product_id, "created_from": created_at, "created_to": created_at}
+    )
+    assert response.json() == []
+
+    # bounds with an offset are converted to UTC: the same instant five hours ahead in +05:00
+    created = datetime.fromisoformat(created_at)
+    shifted = (created + timedelta(hours=5)).isoformat()
+    response = await client.get(
+        "/api/v1/orders/",
+        params={"product_id": product_id, "created_from": f"{shifted}+05:00", "created_to": f"{shifted}+05:00"},
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+    response = await client.get(
+        "/api/v1/orders/", params={"product_id": product_id, "created_from": f"{shifted}+05:00"}
+    )
+    assert [order["id"] for order in response.json()] == order_ids[1:]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_order_stats():
+    product_data = {"name": "Stats Product", "description": None, "price": 2.5, "quantity": 100}
+    product_id = (await client.post("/api/v1/products/", json=product_data)).json()["id"]
+    for quantity in (2, 3, 1):
+        response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": quantity}]})
+    await client.patch(f"/api/v1/orders/{response.json()['id']}/status", json={"status": "cancelled"})
+
+    response = await client.get("/api/v1/orders/stats", params={"product_id": product_id})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["by_status"] == {"in_progress": 2, "cancelled": 1}
+    assert len(data["products"]) == 1
+    sales = data["products"][0]
+    assert (sales["product_id"], sales["product_name"], sales["units"], sales["revenue"]) == (
+        product_id, "Stats Product", 5, 12.5
+    )
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_cancel_order_restores_stock():
+    product_data = {"name": "Cancel Product", "description": None, "price": 1.0, "quantity": 10}
+    product_id = (await client.post("/api/v1/products/", json=product_data)).json()["id"]
+    order_data = {"items": [{"product_id": product_id, "quantity": 3}, {"product_id": product_id, "quantity": 2}]}
+    order_id = (await client.post("/api/v1/orders/", json=order_data)).json()["id"]
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 5
+
+    response = await client.patch(f"/api/v1/orders/{order_id}/status", json={"status": "cancelled"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 10
+
+    response = await client.patch(f"/api/v1/orders/{order_id}/status", json={"status": "shipped"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Cannot change order status from cancelled to shipped."
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 10
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_bulk_status_transition():
+    product_data = {"name": "Wave Product", "description": None, "price": 1.0, "quantity": 10}
+    product_id = (await client.post("/api/v1/products/", json=product_data)).json()["id"]
+    order_ids = []
+    for _ in range(3):
+        response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]})
+        order_ids.append(response.json()["id"])
+    await client.patch(f"/api/v1/orders/{order_ids[2]}/status", json={"status": "cancelled"})
+
+    response = await client.post(
+        "/api/v1/orders/status-transitions", json={"order_ids": order_ids + [99999], "status": "shipped"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "shipped", "transitioned": order_ids[:2], "rejected": [order_ids[2], 99999]}
+    for order_id in order_ids[:2]:
+        assert (await client.get(f"/api/v1/orders/{order_id}")).json()["status"] == "shipped"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_create_order_replays_idempotency_key(create_product):
+    product_id = await create_product("Idempotent Order Product")
+    body = {"items": [{"product_id": product_id, "quantity": 3}]}
+    headers = {"Idempotency-Key": "order-replay"}
+
+    first = await client.post("/api/v1/orders/", json=body, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    await client.patch(f"/api/v1/orders/{first.json()['id']}/status", json={"status": "shipped"})
+    second = await client.post("/api/v1/orders/", json=body, headers=headers)
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 7
+
+    mismatch = await client.post(
+        "/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]}, headers=headers
+    )
+    assert mismatch.status_code == 422
+
+
+@pytest.mark.commits
+@pytest.mark.asyncio(loop_scope="function")
+async def test_concurrent_duplicate_orders_wait_for_the_first(create_product):
+    product_id = await create_product("Concurrent Idempotent Product")
+    body = {"items": [{"product_id": product_id, "quantity": 2}]}
+    headers = {"Idempotency-Key": "order-concurrent"}
+
+    responses = await asyncio.gather(*(client.post("/api/v1/orders/", json=body, headers=headers) for _ in range(5)))
+    assert {r.status_code for r in responses} == {201}
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sum("Idempotent-Replayed" in r.headers for r in responses) == 4
+
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 8
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_expired_idempotency_key_is_reusable(monkeypatch, db_session, create_product):
+    from app.core.config import settings
+    from app.services.idempotency import purge_expired_keys
+
+    product_id = await create_product("Expiring Idempotent Product")
+    body = {"items": [{"product_id": product_id, "quantity": 1}]}
+    headers = {"Idempotency-Key": "order-expiring"}
+    monkeypatch.setattr(settings, "IDEMPOTENCY_KEY_TTL_SECONDS", 0)
+
+    first = await client.post("/api/v1/orders/", json=body, headers=headers)
+    second = await client.post("/api/v1/orders/", json=body, headers=headers)
+    assert second.status_code == 201
+    assert "Idempotent-Replayed" not in second.headers
+    assert second.json()["id"] != first.json()["id"]
+
+    assert await purge_expired_keys(db_session) >= 1
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_order_endpoints_stay_within_query_budget(query_budget, create_product):
+    product_ids = [await create_product(f"Budget Order Product {i}", quantity=100) for i in range(3)]
+    body = {"items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids]}
+    for _ in range(10):
+        await client.post("/api/v1/orders/", json=body)
+
+    # lock, decrement, order, one insert per item at most, outbox event
+    with query_budget(8):
+        response = await client.post("/api/v1/orders/", json=body)
+    order_id = response.json()["id"]
+    # orders and their items, independent of page size
+    for limit in (2, 50):
+        with query_budget(2):
+            await client.get("/api/v1/orders/", params={"limit": limit})
+    with query_budget(2):
+        await client.get(f"/api/v1/orders/{order_id}")
+    with query_budget(2):
+        await client.get("/api/v1/orders/stats")
+    # read, update, outbox event, stock release (3) and re-read (2)
+    with query_budget(9):
+        await client.patch(f"/api/v1/orders/{order_id}/status", json={"status": "cancelled"})
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_orders_conditional_get(query_budget):
+    response = await client.post("/api/v1/products/", json={"name": "Etag Ordered", "price": 1.0, "quantity": 5})
+    product_id = response.json()["id"]
+    response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 1}]})
+    order_id = response.json()["id"]
+
+    response = await client.get(f"/api/v1/orders/{order_id}")
+    etag = response.headers["ETag"]
+    assert (await client.get(f"/api/v1/orders/{order_id}", headers={"If-None-Match": etag})).status_code == 304
+    response = await client.get("/api/v1/orders/", params={"product_id": product_id})
+    list_etag = response.headers["ETag"]
+    with query_budget(1):
+        response = await client.get("/api/v1/orders/", params={"product_id": product_id}, headers={"If-None-Match": list_etag})
+    assert response.status_code == 304
+
+    await client.patch(f"/api/v1/orders/{order_id}/status", json={"status": "shipped"})
+    response = await client.get(f"/api/v1/orders/{order_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v2"'
+    response = await client.get("/api/v1/orders/", params={"product_id": product_id}, headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.json()[0]["status"] == "shipped"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_sharded_stock(create_product):
+    product_id = await create_product("Sharded Product", quantity=10)
+    other_id = await create_product("Sharded Order Neighbour", quantity=10)
+
+    async def quantity() -> int:
+        response = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+        return response.json()["quantity"]
+
+    response = await client.put(f"/api/v1/products/{product_id}/stock-shards", json={"slots": 4})
+    assert response.status_code == 200
+    assert response.json() == {"product_id": product_id, "slots": 4, "quantities": [3, 3, 2, 2]}
+    etag = (await client.get(f"/api/v1/products/{product_id}")).headers["ETag"]
+    assert await quantity() == 10
+
+    # one slot holds enough
+    body = {"items": [{"product_id": product_id, "quantity": 3}, {"product_id": other_id, "quantity": 1}]}
+    first = await client.post("/api/v1/orders/", json=body)
+    assert first.status_code == 201
+    assert await quantity() == 7
+    assert (await client.get(f"/api/v1/products/{product_id}", headers={"If-None-Match": etag})).status_code == 200
+    # no single slot holds 6, so it is taken from several
+    response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 6}]})
+    assert response.status_code == 201
+    assert await quantity() == 1
+    response = await client.post("/api/v1/orders/", json={"items": [{"product_id": product_id, "quantity": 2}]})
+    assert response.status_code == 400
+
+    await client.patch(f"/api/v1/orders/{first.json()['id']}/status", json={"status": "cancelled"})
+    assert await quantity() == 4
+    response = await client.post(
+        "/api/v1/products/stock-adjustments",
+        json={"adjustments": [{"product_id": product_id, "delta": 5}, {"product_id": other_id, "delta": -1}]},
+    )
+    assert response.json()["products"] == [
+        {"product_id": product_id, "quantity": 9},
+        {"product_id": other_id, "quantity": 9},
+    ]
+    response = await client.post(
+        "/api/v1/products/stock-adjustments", json={"adjustments": [{"product_id": product_id, "delta": -10}]}
+    )
+    assert response.status_code == 400
+
+    # an absolute quantity replaces what the slots held
+    await client.put(f"/api/v1/products/{product_id}", json={"quantity": 20})
+    assert await quantity() == 20
+    listed = (await client.get("/api/v1/products/", params={"limit": 1000})).json()
+    assert [p["quantity"] for p in listed if p["id"] == product_id] == [20]
+
+    response = await client.put(f"/api/v1/products/{product_id}/stock-shards", json={"slots": 0})
+    assert response.json()["quantities"] == []
+    assert await quantity() == 20
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_batched_orders_commit_together(monkeypatch, create_product):
+    from app.core.config import settings
+    from app.services import order as order_service
+
+    batch_sizes = []
+    create_order_batch = order_service.order_batcher.run_batch
+
+    async def counting_batch(db, orders):
+        batch_sizes.append(len(orders))
+        return await create_order_batch(db, orders)
+
+    monkeypatch.setattr(settings, "ORDER_BATCH_ENABLED", True)
+    monkeypatch.setattr(order_service.order_batcher, "run_batch", counting_batch)
+    monkeypatch.setattr(order_service.order_batcher, "window", 0.05)
+    product_id = await create_product("Batched Order Product", quantity=3)
+    bodies = [{"items": [{"product_id": product_id, "quantity": 1}]} for _ in range(5)]
+    bodies.insert(2, {"items": [{"product_id": 999999, "quantity": 1}]})
+
+    responses = await asyncio.gather(*(client.post("/api/v1/orders/", json=body) for body in bodies))
+    assert batch_sizes == [6]
+    assert [r.status_code for r in responses] == [201, 201, 400, 201, 400, 400]
+    assert "does not exist" in responses[2].json()["detail"]
+    assert "Insufficient quantity" in responses[5].json()["detail"]
+    for response in responses:
+        if response.status_code == 201:
+            assert response.json() == (await client.get(f"/api/v1/orders/{response.json()['id']}")).json()
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 0
+
+
+@pytest.mark.commits
+@pytest.mark.asyncio(loop_scope="function")
+async def test_full_order_batch_runs_without_waiting(monkeypatch, create_product):
+    from app.core.config import settings
+    from app.services import order as order_service
+
+    batch_sizes = []
+    create_order_batch = order_service.order_batcher.run_batch
+
+    async def counting_batch(db, orders):
+        batch_sizes.append(len(orders))
+        return await create_order_batch(db, orders)
+
+    monkeypatch.setattr(settings, "ORDER_BATCH_ENABLED", True)
+    monkeypatch.setattr(order_service.order_batcher, "run_batch", counting_batch)
+    monkeypatch.setattr(order_service.order_batcher, "window", 0.05)
+    monkeypatch.setattr(order_service.order_batcher, "max_size", 2)
+    product_id = await create_product("Full Batch Order Product")
+    body = {"items": [{"product_id": product_id, "quantity": 1}]}
+
+    # two full batches run at once; the fifth order waits out the window alone
+    responses = await asyncio.gather(*(client.post("/api/v1/orders/", json=body) for _ in range(5)))
+    assert [r.status_code for r in responses] == [201] * 5
+    assert batch_sizes == [2, 2, 1]
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 5
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_queued_orders_are_created_by_workers(db_sessionmaker, create_product):
+    from app.services.order_intake import OrderIntakeWorkers
+
+    product_id = await create_product("Queued Order Product", quantity=3)
+    bodies = [
+        {"items": [{"product_id": product_id, "quantity": 2}]},
+        {"items": [{"product_id": product_id, "quantity": 2}]},
+        {"items": [{"product_id": 999999, "quantity": 1}]},
+    ]
+    queued = [await client.post("/api/v1/orders/intake", json=body) for body in bodies]
+    assert [r.status_code for r in queued] == [202] * 3
+    assert all(r.json()["status"] == "queued" for r in queued)
+    assert queued[0].headers["Location"] == f"http://test/api/v1/orders/intake/{queued[0].json()['id']}"
+    assert (await client.post("/api/v1/orders/intake", json={"items": [{"product_id": product_id}]})).status_code == 422
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 3
+
+    workers = OrderIntakeWorkers(db_sessionmaker, batch_size=2)
+    await workers.refresh_stats()
+    assert workers.queue_depth == 3
+    assert [await workers.process_once() for _ in range(3)] == [2, 1, 0]
+    await workers.refresh_stats()
+    assert (workers.queue_depth, workers.completed, workers.failed) == (0, 1, 2)
+
+    first, second, third = [(await client.get(r.headers["Location"])).json() for r in queued]
+    assert first["status"] == "completed" and first["error"] is None
+    order = await client.get(f"/api/v1/orders/{first['order_id']}")
+    assert order.json()["items"][0]["quantity"] == 2
+    assert second["status"] == "failed" and "Insufficient quantity" in second["error"]
+    assert third["status"] == "failed" and "does not exist" in third["error"]
+    product = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+    assert product.json()["quantity"] == 1
+    assert (await client.get("/api/v1/orders/intake/999999")).status_code == 404
+    assert 'order_intake_lag_seconds_count{status="failed"}' in (await client.get("/metrics")).text
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_queued_orders_are_retried_after_a_lost_stock_race(db_sessionmaker, monkeypatch, create_product):
+    from app.services import order as order_service
+    from app.services.order_intake import OrderIntakeWorkers
+
+    product_id = await create_product("Retried Queued Order Product", quantity=3)
+    queued = await client.post("/api/v1/orders/intake", json={"items": [{"product_id": product_id, "quantity": 1}]})
+    create_orders = order_service.create_orders_in_transaction
+    attempts = []
+
+    async def lose_first_race(db, orders):
+        attempts.append(len(orders))
+        if len(attempts) == 1:
+            raise order_service._StockChangedError()
+        return await create_orders(db, orders)
+
+    monkeypatch.setattr(order_service, "create_orders_in_transaction", lose_first_race)
+    assert await OrderIntakeWorkers(db_sessionmaker).process_once() == 1
+    assert attempts == [1, 1]
+    assert (await client.get(queued.headers["Location"])).json()["status"] == "completed"
@@ -1,7 +1,15 @@
+import csv
+import io
+import json
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 
+from app.core.cache import InMemoryBackend
+from app.core.exceptions import VersionConflictError
 from app.main import app
+from app.schemas.product import ProductUpdate
+from app.services import product as product_service
 
 transport = ASGITransport(app=app)
 client = AsyncClient(transport=transport, base_url="http://test")
@@ -64,6 +72,20 @@ async def test_read_products():
     assert any(p["name"] == "Product 2" for p in data)
 
 
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_products_body_matches_single_reads():
+    for name in ("Serialized Ä", "Serialized \"quoted\""):
+        await client.post("/api/v1/products/", json={"name": name, "description": None, "price": 0.1, "quantity": 1})
+
+    response = await client.get("/api/v1/products/")
+    assert response.headers["content-type"] == "application/json"
+    singles = [
+        (await client.get(f"/api/v1/products/{p['id']}", headers={"Cache-Control": "no-cache"})).content
+        for p in response.json()
+    ]
+    assert response.content == b"[" + b",".join(singles) + b"]"
+
+
 @pytest.mark.asyncio(loop_scope="function")
 async def test_read_product():
     product_data = {
@@ -149,3 +171,309 @@ async def test_delete_nonexistent_product():
     response = await client.delete("/api/v1/products/9999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Product with id 9999 does not exist."
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_products_with_cursor():
+    for index in range(5):
+        product = {"name": f"Cursor Product {index}", "description": None, "price": 1.0, "quantity": 1}
+        assert (await client.post("/api/v1/products/", json=product)).status_code == 201
+
+    seen = []
+    response = await client.get("/api/v1/products/", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen.extend(p["id"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = await client.get("/api/v1/products/", params={"limit": 2, "cursor": cursor})
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen))
+    all_response = await client.get("/api/v1/products/", params={"limit": 1000})
+    assert seen == [p["id"] for p in all_response.json()]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_products_with_invalid_cursor():
+    response = await client.get("/api/v1/products/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor."
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_export_products():
+    product_data = {"name": "Export Product", "description": "Exported, with comma", "price": 12.5, "quantity": 7}
+    create_response = await client.post("/api/v1/products/", json=product_data)
+    product_id = create_response.json()["id"]
+
+    response = await client.get("/api/v1/products/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert {**product_data, "id": product_id} in records
+
+    response = await client.get("/api/v1/products/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    row = next(row for row in rows if row["id"] == str(product_id))
+    assert row["description"] == product_data["description"]
+    assert len(rows) == len(records)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_bulk_upsert_products():
+    existing = {"name": "Bulk Existing", "description": "Old", "price": 1.0, "quantity": 1}
+    create_response = await client.post("/api/v1/products/", json=existing)
+    existing_id = create_response.json()["id"]
+
+    batch = [
+        {"name": "Bulk Existing", "description": "New", "price": 2.0, "quantity": 5},
+        {"name": "Bulk New", "description": None, "price": 3.0, "quantity": 10},
+        {"name": "Bulk Invalid", "price": -1.0, "quantity": 1},
+    ]
+    response = await client.post("/api/v1/products/bulk", json=batch, params={"chunk_size": 1})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["updated"], data["errors"]) == (1, 1, 1)
+    statuses = [(result["index"], result["status"]) for result in data["results"]]
+    assert statuses == [(0, "updated"), (1, "created"), (2, "error")]
+    assert data["results"][0]["id"] == existing_id
+    assert data["results"][2]["error"].startswith("price:")
+
+    get_response = await client.get(f"/api/v1/products/{existing_id}")
+    assert get_response.json()["description"] == "New"
+    assert get_response.json()["quantity"] == 5
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_bulk_upsert_products_ndjson():
+    body = "\n".join([
+        json.dumps({"name": "Bulk NDJSON", "price": 1.0, "quantity": 1}),
+        "{not json",
+        json.dumps({"name": "Bulk NDJSON", "price": 4.0, "quantity": 4}),
+    ])
+    response = await client.post(
+        "/api/v1/products/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["error", "error", "created"]
+    assert results[1]["error"].startswith("Invalid JSON")
+
+    response = await client.post("/api/v1/products/bulk", json={"name": "Not a list"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stock_adjustments():
+    ids = []
+    for name, quantity in (("Adjust A", 10), ("Adjust B", 1)):
+        response = await client.post("/api/v1/products/", json={"name": name, "price": 1.0, "quantity": quantity})
+        ids.append(response.json()["id"])
+
+    batch = {"adjustments": [
+        {"product_id": ids[0], "delta": 5},
+        {"product_id": ids[1], "delta": -1},
+        {"product_id": ids[0], "delta": -2},
+    ]}
+    headers = {"Idempotency-Key": f"receiving-{ids[0]}"}
+    response = await client.post("/api/v1/products/stock-adjustments", json=batch, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "replayed": False,
+        "products": [{"product_id": ids[0], "quantity": 13}, {"product_id": ids[1], "quantity": 0}],
+    }
+
+    replay = await client.post("/api/v1/products/stock-adjustments", json=batch, headers=headers)
+    assert replay.status_code == 200
+    assert replay.json()["replayed"] is True
+    assert replay.json()["products"] == response.json()["products"]
+    assert (await client.get(f"/api/v1/products/{ids[0]}")).json()["quantity"] == 13
+
+    mismatch = await client.post(
+        "/api/v1/products/stock-adjustments", json={"adjustments": [{"product_id": ids[0], "delta": 1}]}, headers=headers
+    )
+    assert mismatch.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stock_adjustments_are_atomic():
+    response = await client.post("/api/v1/products/", json={"name": "Adjust Atomic", "price": 1.0, "quantity": 2})
+    product_id = response.json()["id"]
+
+    batch = {"adjustments": [{"product_id": product_id, "delta": 5}, {"product_id": 9999, "delta": 1}]}
+    response = await client.post("/api/v1/products/stock-adjustments", json=batch)
+    assert response.status_code == 404
+
+    batch = {"adjustments": [{"product_id": product_id, "delta": -3}]}
+    response = await client.post("/api/v1/products/stock-adjustments", json=batch)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient quantity for product Adjust Atomic."
+
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 2
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_product_is_cached_and_invalidated():
+    cache = product_service.product_cache
+    shared = InMemoryBackend()
+    cache.shared = shared
+    try:
+        product = {"name": "Cached Product", "price": 2.0, "quantity": 10}
+        create_response = await client.post("/api/v1/products/", json=product)
+        product_id = create_response.json()["id"]
+
+        misses = cache.misses
+        hits = cache.hits
+        first = await client.get(f"/api/v1/products/{product_id}")
+        second = await client.get(f"/api/v1/products/{product_id}")
+        assert first.json() == second.json()
+        assert (cache.misses, cache.hits) == (misses + 1, hits + 1)
+        assert await shared.get(f"product:{product_id}") == first.json()
+
+        await cache.local.clear()
+        shared_hits = cache.shared_hits
+        assert (await client.get(f"/api/v1/products/{product_id}")).json() == first.json()
+        assert cache.shared_hits == shared_hits + 1
+
+        order = {"items": [{"product_id": product_id, "quantity": 4}]}
+        assert (await client.post("/api/v1/orders/", json=order)).status_code == 201
+        assert await shared.get(f"product:{product_id}") is None
+        assert (await client.get(f"/api/v1/products/{product_id}")).json()["quantity"] == 6
+
+        await client.put(f"/api/v1/products/{product_id}", json={"price": 3.0})
+        assert (await client.get(f"/api/v1/products/{product_id}")).json()["price"] == 3.0
+
+        hits = cache.hits
+        response = await client.get(f"/api/v1/products/{product_id}", headers={"Cache-Control": "no-cache"})
+        assert response.status_code == 200
+        assert cache.hits == hits
+    finally:
+        cache.shared = None
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_product_endpoints_stay_within_query_budget(query_budget):
+    product_ids = []
+    for i in range(5):
+        response = await client.post(
+            "/api/v1/products/", json={"name": f"Budget Product {i}", "description": "d", "price": 1.0, "quantity": 10}
+        )
+        product_ids.append(response.json()["id"])
+
+    for limit in (2, 50):
+        with query_budget(1):
+            await client.get("/api/v1/products/", params={"limit": limit})
+    with query_budget(1):
+        await client.get(f"/api/v1/products/{product_ids[0]}", headers={"Cache-Control": "no-cache"})
+    with query_budget(0):
+        await client.get(f"/api/v1/products/{product_ids[0]}")
+    # one guarded update for every product, plus one outbox insert per product at most
+    with query_budget(1 + len(product_ids)):
+        await client.post(
+            "/api/v1/products/stock-adjustments",
+            json={"adjustments": [{"product_id": product_id, "delta": 1} for product_id in product_ids]},
+        )
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_product_conditional_get():
+    response = await client.post("/api/v1/products/", json={"name": "Etag Product", "price": 1.0, "quantity": 5})
+    product_id = response.json()["id"]
+
+    response = await client.get(f"/api/v1/products/{product_id}")
+    etag = response.headers["ETag"]
+    assert etag == '"v1"'
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = await client.get(f"/api/v1/products/{product_id}", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    await client.post("/api/v1/products/stock-adjustments", json={"adjustments": [{"product_id": product_id, "delta": 1}]})
+    response = await client.get(f"/api/v1/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v2"'
+    assert response.json()["quantity"] == 6
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_read_products_conditional_get(query_budget):
+    response = await client.post("/api/v1/products/", json={"name": "Etag Listed", "price": 1.0, "quantity": 5})
+    product_id = response.json()["id"]
+    response = await client.get("/api/v1/products/")
+    etag = response.headers["ETag"]
+
+    # only the (id, version) probe runs
+    with query_budget(1):
+        response = await client.get("/api/v1/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    await client.put(f"/api/v1/products/{product_id}", json={"price": 2.0})
+    response = await client.get("/api/v1/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [p["price"] for p in response.json() if p["id"] == product_id] == [2.0]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_update_product_if_match(db_session):
+    response = await client.post("/api/v1/products/", json={"name": "Etag Updated", "price": 1.0, "quantity": 5})
+    product_id = response.json()["id"]
+
+    response = await client.put(f"/api/v1/products/{product_id}", json={"price": 2.0}, headers={"If-Match": '"v1"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v2"'
+    assert response.json()["version"] == 2
+
+    for stale in ('"v1"', 'W/"v2"'):
+        response = await client.put(f"/api/v1/products/{product_id}", json={"price": 3.0}, headers={"If-Match": stale})
+        assert response.status_code == 412
+    assert (await client.get(f"/api/v1/products/{product_id}")).json()["price"] == 2.0
+
+    # a change committed between reading the product and writing it is caught by the guarded UPDATE
+    product = await product_service.read_product(db_session, product_id)
+    await client.put(f"/api/v1/products/{product_id}", json={"price": 4.0})
+    with pytest.raises(VersionConflictError):
+        await product_service.update_product(
+            db_session, product_id, ProductUpdate(price=5.0), expected_version=product.version
+        )
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_search_products():
+    products = [
+        {"name": "Big Zqx Gear", "price": 1.0, "quantity": 1},
+        {"name": "Plain Gear", "description": "fits a ZQX mount", "price": 1.0, "quantity": 1},
+        {"name": "Zqx Gear", "price": 1.0, "quantity": 1},
+        {"name": "zqx", "price": 1.0, "quantity": 1},
+        {"name": "Unrelated Gear", "price": 1.0, "quantity": 1},
+    ]
+    for product in products:
+        await client.post("/api/v1/products/", json=product)
+
+    names = []
+    params = {"q": "Zqx", "limit": 3}
+    while True:
+        response = await client.get("/api/v1/products/search", params=params)
+        assert response.status_code == 200
+        names += [hit["name"] for hit in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert names == ["zqx", "Zqx Gear", "Big Zqx Gear", "Plain Gear"]
+
+    await client.post("/api/v1/products/", json={"name": "Zqx 50%_off", "price": 1.0, "quantity": 1})
+    await client.post("/api/v1/products/", json={"name": "Zqx 50 of", "price": 1.0, "quantity": 1})
+    response = await client.get("/api/v1/products/search", params={"q": "50%_"})
+    hits = response.json()
+    assert hits[0]["name"] == "Zqx 50%_off"
+    # % and _ match literally; on PostgreSQL the other name can only come back as a typo match
+    assert all(hit["score"] == 0 for hit in hits[1:])
+
+    assert (await client.get("/api/v1/products/search", params={"q": "zq"})).status_code == 422
+    response = await client.get("/api/v1/products/search", params={"q": "zqx", "cursor": "not-a-cursor"})
+    assert response.status_code == 400